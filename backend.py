@@ -0,0 +1,168 @@
+import os
+import sqlite3
+import threading
+import pandas as pd
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+from cache import data_version
+from model import Database
+from pool import ConnectionPool
+from queries import ROLLUPS, version_datos
+
+# Motor con el que el tablero consulta los datos: 'sqlite' (por defecto) o 'duckdb'
+BACKEND = os.environ.get('SNIES_BACKEND', 'sqlite')
+# Carpeta con la exportación en Parquet del modelo estrella que usa el backend duckdb
+PARQUET_DIR = os.environ.get('SNIES_PARQUET', 'estrella')
+
+MEDIDAS = ['inscritos', 'matriculados', 'admitidos', 'graduados']
+
+class SQLiteBackend:
+    """Ejecuta las consultas del tablero sobre la base SQLite, con un pool de conexiones de solo lectura."""
+    def __init__(self, db_name, pool_size=8):
+        self.db_name = db_name
+        self.pool = ConnectionPool(db_name, size=pool_size)
+
+    def version(self):
+        """
+        Firma de la versión de los datos: el archivo de la base y la versión que
+        publica cada cargue al terminar (VersionDatos). Los lotes confirmados
+        durante un cargue no la cambian.
+        """
+        with self.pool.connection() as conn:
+            try:
+                fila = conn.execute(version_datos).fetchone()
+            except sqlite3.OperationalError:
+                # Base creada antes de VersionDatos; cambia con el siguiente create_tables
+                fila = None
+        return (os.stat(self.db_name).st_ino, fila[0] if fila else None)
+
+    def read(self, query, params=()):
+        """Ejecuta una consulta y retorna el resultado como DataFrame."""
+        with self.pool.connection() as conn:
+            return pd.read_sql_query(query, conn, params=params)
+
+    def close(self):
+        self.pool.close_all()
+
+class _Generacion:
+    """Una carga de los datos en DuckDB: la conexión, los cursores de los hilos y las lecturas en curso."""
+    def __init__(self, conexion):
+        self.conexion = conexion
+        self.cursores = []
+        self.en_uso = 0
+        self.retirada = False
+
+    def cerrar(self):
+        # La base en memoria se libera cuando se cierran la conexión y todos sus cursores
+        for cursor in self.cursores:
+            cursor.close()
+        self.conexion.close()
+
+class DuckDBBackend:
+    """
+    Ejecuta las consultas del tablero con DuckDB, un motor columnar embebido
+    que agrega en varios hilos, sobre la exportación en Parquet del modelo
+    estrella (Database.export_parquet).
+
+    Las tablas se cargan en memoria y las tablas de resumen de queries.ROLLUPS
+    se calculan sobre ellas al cargar, de modo que las mismas consultas SQL
+    retornan los mismos resultados que en SQLite. Si la exportación cambia,
+    los datos se vuelven a cargar en la siguiente consulta y la carga anterior
+    se cierra cuando terminan las lecturas que la estaban usando.
+    """
+    def __init__(self, ruta=PARQUET_DIR, threads=None):
+        if duckdb is None:
+            raise ImportError("El backend duckdb requiere el paquete duckdb")
+        self.ruta = ruta
+        self.threads = threads
+        self._lock = threading.Lock()
+        self._recarga = threading.Lock()
+        self._local = threading.local()
+        self._version = None
+        self._generacion = None
+        self._recargar_si_cambio()
+
+    def version(self):
+        """Firma de la versión de la exportación; cambia cuando se vuelve a exportar."""
+        return data_version(os.path.join(self.ruta, 'manifiesto.json'))
+
+    def read(self, query, params=()):
+        """Ejecuta una consulta y retorna el resultado como DataFrame."""
+        self._recargar_si_cambio()
+        with self._lock:
+            generacion = self._generacion
+            generacion.en_uso += 1
+        try:
+            return self._cursor(generacion).execute(query, list(params)).df()
+        finally:
+            with self._lock:
+                generacion.en_uso -= 1
+                cerrar = generacion.retirada and generacion.en_uso == 0
+            if cerrar:
+                generacion.cerrar()
+
+    def close(self):
+        with self._lock:
+            generacion, self._generacion = self._generacion, None
+            self._version = None
+            if generacion is not None:
+                generacion.retirada = True
+                cerrar = generacion.en_uso == 0
+        if generacion is not None and cerrar:
+            generacion.cerrar()
+
+    def _cursor(self, generacion):
+        # Cada hilo usa su propio cursor de la carga vigente
+        if getattr(self._local, 'generacion', None) is not generacion:
+            self._local.generacion = generacion
+            self._local.cursor = generacion.conexion.cursor()
+            with self._lock:
+                generacion.cursores.append(self._local.cursor)
+        return self._local.cursor
+
+    def _recargar_si_cambio(self):
+        version = self.version()
+        if version == self._version:
+            return
+        with self._recarga:
+            if version == self._version:
+                return
+            nueva = _Generacion(self._cargar())
+            with self._lock:
+                anterior, self._generacion = self._generacion, nueva
+                self._version = version
+                if anterior is not None:
+                    anterior.retirada = True
+                    cerrar = anterior.en_uso == 0
+            if anterior is not None and cerrar:
+                anterior.cerrar()
+
+    def _cargar(self):
+        conexion = duckdb.connect(':memory:')
+        if self.threads:
+            conexion.execute(f"SET threads = {int(self.threads)}")
+        # SQLite ordena los nulos primero en orden ascendente
+        conexion.execute("SET default_null_order = 'nulls_first'")
+        for table_name in Database.STAR_TABLES:
+            ruta = os.path.join(self.ruta, f"{table_name}.parquet")
+            conexion.execute(f"CREATE TABLE {table_name} AS SELECT * FROM read_parquet(?)", [ruta])
+        for table_name, (query, index_columns) in ROLLUPS.items():
+            # Las sumas de DuckDB son HUGEINT; se llevan a BIGINT como en SQLite. Las filas
+            # quedan ordenadas por las columnas del índice para que los filtros por
+            # institución solo lean los bloques que la contienen
+            medidas = ', '.join(f"CAST({medida} AS BIGINT) AS {medida}" for medida in MEDIDAS)
+            conexion.execute(
+                f"CREATE TABLE {table_name} AS SELECT * REPLACE ({medidas}) FROM ({query}) "
+                f"ORDER BY {', '.join(index_columns)}"
+            )
+        return conexion
+
+def crear_backend(db_name='snies.db', backend=BACKEND, parquet_dir=PARQUET_DIR):
+    """Crea el backend de consultas indicado en la configuración."""
+    if backend == 'sqlite':
+        return SQLiteBackend(db_name)
+    if backend == 'duckdb':
+        return DuckDBBackend(parquet_dir)
+    raise ValueError(f"Backend desconocido: {backend}")
@@ -0,0 +1,296 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+import numpy as np
+import openpyxl
+import pandas as pd
+from constant import columnas_requeridas_A, columnas_requeridas_G, columnas_requeridas_I, columnas_requeridas_M
+from model import Database, Cargue
+
+# Columnas de cada dataset, como en los archivos del SNIES
+ESQUEMAS = {
+    'A': columnas_requeridas_A,
+    'M': columnas_requeridas_M,
+    'G': columnas_requeridas_G,
+    'I': columnas_requeridas_I,
+}
+
+# Departamentos y municipios de oferta: (código dpto, departamento, código municipio, municipio)
+UBICACIONES = [
+    ('11', 'Bogotá, D.C.', 11001, 'Bogotá, D.C.'),
+    ('05', 'Antioquia', 5001, 'Medellín'),
+    ('05', 'Antioquia', 5088, 'Bello'),
+    ('76', 'Valle del Cauca', 76001, 'Cali'),
+    ('08', 'Atlántico', 8001, 'Barranquilla'),
+    ('68', 'Santander', 68001, 'Bucaramanga'),
+    ('17', 'Caldas', 17001, 'Manizales'),
+    ('13', 'Bolívar', 13001, 'Cartagena de Indias'),
+]
+NIVELES = ['Pregrado', 'Posgrado', 'Sin información']
+MODALIDADES = ['Presencial', 'Virtual', 'Distancia', 'Sin información']
+CARACTERES = ['Universidad', 'Institución Universitaria/Escuela Tecnológica', 'Institución Tecnológica']
+
+# Hoja y fila de encabezado con las que preparation.py lee los archivos
+HOJA = 1
+ENCABEZADO = 5
+
+def generar_datos(n_instituciones=5, n_programas=50, anios=(2023,), semilla=0):
+    """
+    Genera datasets sintéticos del SNIES con los esquemas columnas_requeridas_*.
+    Cada programa de cada institución tiene una fila por sexo, año y semestre;
+    cada dataset cubre una parte distinta de esas filas, como en los archivos reales.
+    Retorna un diccionario dataset -> DataFrame.
+    """
+    rng = np.random.default_rng(semilla)
+    instituciones = np.arange(n_instituciones)
+    programas = np.arange(n_programas)
+    indice = pd.MultiIndex.from_product(
+        [instituciones, programas, ['Femenino', 'Masculino'], list(anios), [1, 2]],
+        names=['inst', 'prog', 'SEXO', 'AÑO', 'SEMESTRE'],
+    ).to_frame(index=False)
+
+    # Atributos fijos de cada institución y de cada programa
+    inst, prog = indice['inst'].to_numpy(), indice['prog'].to_numpy()
+    ubicacion = rng.integers(0, len(UBICACIONES), (n_instituciones, n_programas))[inst, prog]
+    nivel = rng.integers(0, len(NIVELES), (n_instituciones, n_programas))[inst, prog]
+    modalidad = rng.integers(0, len(MODALIDADES), (n_instituciones, n_programas))[inst, prog]
+    caracter = rng.integers(0, len(CARACTERES), n_instituciones)[inst]
+    ubicaciones = np.array(UBICACIONES, dtype=object)[ubicacion]
+
+    base = pd.DataFrame({
+        'CÓDIGO DE LA INSTITUCIÓN': 1000 + inst,
+        'INSTITUCIÓN DE EDUCACIÓN SUPERIOR (IES)': [f"INSTITUCION {i:04d}" for i in inst],
+        'CARÁCTER IES': np.array(CARACTERES, dtype=object)[caracter],
+        'PROGRAMA ACADÉMICO': [f"PROGRAMA {p:04d}" for p in prog],
+        'NIVEL ACADÉMICO': np.array(NIVELES, dtype=object)[nivel],
+        'MODALIDAD': np.array(MODALIDADES, dtype=object)[modalidad],
+        'CÓDIGO DEL DEPARTAMENTO (PROGRAMA)': ubicaciones[:, 0],
+        'DEPARTAMENTO DE OFERTA DEL PROGRAMA': ubicaciones[:, 1],
+        'CÓDIGO DEL MUNICIPIO (PROGRAMA)': ubicaciones[:, 2].astype(np.int64),
+        'MUNICIPIO DE OFERTA DEL PROGRAMA': ubicaciones[:, 3],
+        'SEXO': indice['SEXO'].to_numpy(),
+        'AÑO': indice['AÑO'].to_numpy(),
+        'SEMESTRE': indice['SEMESTRE'].to_numpy(),
+    })
+
+    datos = {}
+    for dataset, columnas in ESQUEMAS.items():
+        df = base.sample(frac=0.85, random_state=rng.integers(2**31)).sort_index()
+        df[columnas[-1]] = rng.integers(0, 500, len(df))
+        datos[dataset] = df[columnas].reset_index(drop=True)
+    return datos
+
+def escribir_excel(df, ruta, hoja=HOJA, encabezado=ENCABEZADO):
+    """
+    Escribe un DataFrame como un libro del SNIES: la tabla va en la hoja `hoja`,
+    con filas de título antes del encabezado y una columna extra que no se lee.
+    """
+    libro = openpyxl.Workbook(write_only=True)
+    for _ in range(hoja):
+        libro.create_sheet()
+    hoja_excel = libro.create_sheet('Datos')
+    for i in range(encabezado):
+        hoja_excel.append([f"Información de referencia {i}"] if i % 2 == 0 else [])
+    hoja_excel.append(list(df.columns) + ['ID CINE CAMPO AMPLIO'])
+    for fila in df.itertuples(index=False):
+        hoja_excel.append([valor.item() if hasattr(valor, 'item') else valor for valor in fila] + [1])
+    libro.save(ruta)
+
+def medir(funcion, repeticiones, preparar=None):
+    """Ejecuta `funcion` varias veces y retorna sus tiempos en segundos y el último resultado."""
+    tiempos = []
+    resultado = None
+    for _ in range(repeticiones):
+        if preparar is not None:
+            preparar()
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos, resultado
+
+def resumen(tiempos):
+    """Estadísticas de una lista de tiempos, en milisegundos."""
+    ordenados = sorted(tiempos)
+    return {
+        'n': len(ordenados),
+        'media_ms': statistics.fmean(ordenados) * 1000,
+        'mediana_ms': statistics.median(ordenados) * 1000,
+        'min_ms': ordenados[0] * 1000,
+        'max_ms': ordenados[-1] * 1000,
+        'p95_ms': ordenados[min(len(ordenados) - 1, int(round(0.95 * (len(ordenados) - 1))))] * 1000,
+    }
+
+def benchmark_cargue(carpeta, datos, repeticiones):
+    """Mide Cargue.cargue_archivo (sin y con caché), unificar_dataframes y los cargues a la base."""
+    resultados = {}
+    especificaciones = {}
+    for dataset, df in datos.items():
+        ruta = os.path.join(carpeta, f"{dataset}.xlsx")
+        escribir_excel(df, ruta)
+        especificaciones[dataset] = dict(nombre_archivo=ruta, hoja=HOJA, encabezado=ENCABEZADO,
+                                         codigo_institucion=None, dataset=dataset)
+
+    leidos = {}
+    sin_cache = Cargue(cache_dir=None)
+    for dataset, especificacion in especificaciones.items():
+        tiempos, leidos[dataset] = medir(lambda: sin_cache.cargue_archivo(**especificacion), repeticiones)
+        resultados[f"cargue_archivo[{dataset}]"] = resumen(tiempos)
+
+    con_cache = Cargue(cache_dir=os.path.join(carpeta, 'cache'))
+    for dataset, especificacion in especificaciones.items():
+        con_cache.cargue_archivo(**especificacion)
+        tiempos, _ = medir(lambda: con_cache.cargue_archivo(**especificacion), repeticiones)
+        resultados[f"cargue_archivo_cache[{dataset}]"] = resumen(tiempos)
+
+    argumentos = (leidos['I'], leidos['M'], leidos['A'], leidos['G'])
+    tiempos, df = medir(lambda: sin_cache.unificar_dataframes(*argumentos), repeticiones)
+    resultados['unificar_dataframes'] = resumen(tiempos)
+
+    # Cada repetición carga en una base nueva
+    def base_nueva(nombre):
+        ruta = os.path.join(carpeta, nombre)
+        for sufijo in ('', '-wal', '-shm'):
+            if os.path.exists(ruta + sufijo):
+                os.remove(ruta + sufijo)
+        db = Database(ruta)
+        db.create_tables()
+        return db
+
+    bases = {}
+    tiempos, _ = medir(lambda: bases['filas'].process_dataframe_to_db(df), repeticiones,
+                       preparar=lambda: bases.update(filas=base_nueva('filas.db')))
+    resultados['process_dataframe_to_db'] = resumen(tiempos)
+    tiempos, _ = medir(lambda: bases['bulk'].process_dataframe_to_db_bulk(df), repeticiones,
+                       preparar=lambda: bases.update(bulk=base_nueva('bulk.db')))
+    resultados['process_dataframe_to_db_bulk'] = resumen(tiempos)
+    return resultados, os.path.join(carpeta, 'bulk.db'), len(df)
+
+def benchmark_callbacks(db_name, instituciones, repeticiones):
+    """
+    Mide la latencia de cada callback de tablero.py a través del servidor de Dash,
+    en frío (sin cachés) y en caliente, para cada institución y estado.
+    """
+    os.environ['SNIES_DB'] = db_name
+    os.environ.pop('SNIES_SNAPSHOT', None)
+    os.environ.pop('SNIES_CUBO', None)
+    # Sin precálculo ni caché de respuestas, para que las mediciones en frío no encuentren los cachés llenos
+    os.environ['SNIES_PRECALENTAR'] = '0'
+    os.environ['SNIES_CACHE_RESPUESTAS'] = '0'
+    import tablero
+
+    cliente = tablero.app.server.test_client()
+
+    def llamar(salidas, entradas, disparador):
+        cuerpo = {
+            'output': salidas[0] if len(salidas) == 1 else '..' + '...'.join(salidas) + '..',
+            'outputs': [dict(zip(('id', 'property'), s.split('.'))) for s in salidas],
+            'inputs': [{'id': i, 'property': p, 'value': v} for (i, p), v in entradas],
+            'changedPropIds': [disparador],
+        }
+        if len(salidas) == 1:
+            cuerpo['outputs'] = cuerpo['outputs'][0]
+        respuesta = cliente.post('/_dash-update-component', json=cuerpo)
+        if respuesta.status_code != 200:
+            raise RuntimeError(f"{salidas} respondió {respuesta.status_code}")
+        return respuesta
+
+    def limpiar():
+        tablero.datos_tablero.query_cache.clear()
+        tablero.figuras.clear()
+
+    figuras = {
+        'update_program_gender': 'program_geneder.figure',
+        'update_program_distribution': 'program-distribution.figure',
+        'update_level_modality_distribution': 'level-modality-dist.figure',
+        'update_gender_academic_level': 'gender-academic-level.figure',
+        'update_graduates_map': 'graduates-map.figure',
+    }
+    estados = ['inscritos', 'admitidos', 'matriculados', 'graduados']
+    tiempos = {}
+
+    def registrar(nombre, tiempo):
+        tiempos.setdefault(nombre, []).append(tiempo)
+
+    def cronometrar(nombre, *argumentos):
+        inicio = time.perf_counter()
+        respuesta = llamar(*argumentos)
+        registrar(nombre, time.perf_counter() - inicio)
+        return respuesta
+
+    for _ in range(repeticiones):
+        for institucion in instituciones:
+            entrada = [(('institucion-dropdown', 'value'), institucion)]
+            limpiar()
+            cronometrar('update_datos[frio]', ['datos-store.data'], entrada, 'institucion-dropdown.value')
+            respuesta = cronometrar('update_datos[caliente]', ['datos-store.data'], entrada, 'institucion-dropdown.value')
+            datos = respuesta.get_json()['response']['datos-store']['data']
+
+            for nombre, salida in figuras.items():
+                for estado in estados:
+                    entradas = [(('datos-store', 'data'), datos), (('estado-dropdown', 'value'), estado)]
+                    tablero.figuras.clear()
+                    cronometrar(f"{nombre}[completa]", [salida], entradas, 'datos-store.data')
+                    tablero.figuras.clear()
+                    cronometrar(f"{nombre}[parche]", [salida], entradas, 'estado-dropdown.value')
+                    cronometrar(f"{nombre}[memorizada]", [salida], entradas, 'estado-dropdown.value')
+
+            tabla = ['data-table.data', 'data-table.page_count', 'data-table.page_current']
+            for nombre, orden, filtro in [
+                ('update_table', [], ''),
+                ('update_table[orden_filtro]', [{'column_id': 'inscritos', 'direction': 'desc'}],
+                 '{nombre_programa} icontains "programa" && {matriculados} > 10'),
+            ]:
+                entradas = [(('datos-store', 'data'), datos), (('data-table', 'page_current'), 1),
+                            (('data-table', 'page_size'), tablero.TABLA_TAMANO_PAGINA),
+                            (('data-table', 'sort_by'), orden), (('data-table', 'filter_query'), filtro)]
+                limpiar()
+                cronometrar(f"{nombre}[frio]", tabla, entradas, 'data-table.page_current')
+                cronometrar(f"{nombre}[caliente]", tabla, entradas, 'data-table.page_current')
+    return {nombre: resumen(valores) for nombre, valores in tiempos.items()}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del cargue y del tablero con datos sintéticos del SNIES")
+    parser.add_argument('--instituciones', type=int, default=5)
+    parser.add_argument('--programas', type=int, default=50)
+    parser.add_argument('--anios', type=int, default=1, help="años de datos por programa")
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--salida', default='benchmark.json')
+    parser.add_argument('--sin-callbacks', action='store_true', help="no medir los callbacks del tablero")
+    args = parser.parse_args(argv)
+
+    datos = generar_datos(args.instituciones, args.programas, tuple(range(2023, 2023 + args.anios)), args.semilla)
+    with tempfile.TemporaryDirectory(prefix='benchmark_snies_') as carpeta:
+        resultados, db_name, filas = benchmark_cargue(carpeta, datos, args.repeticiones)
+        if not args.sin_callbacks:
+            instituciones = sorted(datos['I']['INSTITUCIÓN DE EDUCACIÓN SUPERIOR (IES)'].unique())
+            resultados.update(benchmark_callbacks(db_name, instituciones, args.repeticiones))
+
+    reporte = {
+        'fecha': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'parametros': vars(args),
+        'filas': {'entrada': {d: len(df) for d, df in datos.items()}, 'unificadas': filas},
+        'entorno': {
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+        },
+        'resultados': resultados,
+    }
+    with open(args.salida, 'w', encoding='utf-8') as archivo:
+        json.dump(reporte, archivo, ensure_ascii=False, indent=1)
+
+    ancho = max(len(nombre) for nombre in resultados)
+    for nombre, estadisticas in resultados.items():
+        print(f"{nombre:<{ancho}}  mediana {estadisticas['mediana_ms']:9.2f} ms  p95 {estadisticas['p95_ms']:9.2f} ms")
+    print(f"Resultados en {args.salida}")
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+import metricas
+
+class LRUCache:
+    """
+    Caché acotado en memoria que descarta primero el elemento usado hace más tiempo.
+    Es seguro para usarse desde varios hilos.
+    """
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Retorna el valor asociado a la llave y lo marca como usado recientemente."""
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        """Guarda un valor y descarta los más antiguos si se supera el tamaño máximo."""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Vacía el caché."""
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+def data_version(ruta):
+    """
+    Retorna una firma de la versión de un archivo, a partir de su inodo, su
+    fecha de modificación y su tamaño. Sirve para archivos que se reemplazan
+    completos al terminar de escribirse, como el manifiesto de una exportación.
+    """
+    try:
+        estado = os.stat(ruta)
+    except FileNotFoundError:
+        return None
+    return (estado.st_ino, estado.st_mtime_ns, estado.st_size)
+
+class QueryCache:
+    """
+    Caché de resultados de consultas compartido por todo el proceso.
+
+    Las entradas se identifican por consulta y parámetros y se descartan cuando
+    cambia la versión de los datos, que retorna la función `version`. Si varios hilos piden la misma
+    consulta a la vez, solo uno la ejecuta y los demás esperan su resultado.
+    Los DataFrames retornados son compartidos y no deben modificarse.
+    """
+    def __init__(self, version, maxsize=256):
+        self.version = version
+        self.results = LRUCache(maxsize)
+        self._version = None
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def read(self, query, params, fetch, name='consulta'):
+        """
+        Retorna el resultado de la consulta, ejecutándola solo si no está en caché.
+        `fetch(query, params)` ejecuta la consulta y retorna un DataFrame, y
+        `name` identifica la consulta en las métricas.
+        """
+        self._check_version()
+        key = (query, tuple(params))
+        df = self.results.get(key)
+        if df is not None:
+            metricas.contar('snies_consulta_cache_total', consulta=name, resultado='acierto')
+            return df
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            df = self.results.get(key)
+            if df is None:
+                metricas.contar('snies_consulta_cache_total', consulta=name, resultado='fallo')
+                inicio = time.perf_counter()
+                df = fetch(query, params)
+                metricas.consulta(name, df, time.perf_counter() - inicio)
+                self.results.put(key, df)
+            else:
+                metricas.contar('snies_consulta_cache_total', consulta=name, resultado='acierto')
+        with self._lock:
+            self._key_locks.pop(key, None)
+        return df
+
+    def clear(self):
+        """Descarta todos los resultados guardados."""
+        self.results.clear()
+
+    def _check_version(self):
+        version = self.version()
+        if version != self._version:
+            self.results.clear()
+            self._version = version
@@ -61,4 +61,18 @@ columnas_requeridas_M = [
             'AÑO',
             'SEMESTRE',
             'MATRICULADOS'
-        ]
\ No newline at end of file
+        ]
+columnas_categoricas = [
+            'INSTITUCIÓN DE EDUCACIÓN SUPERIOR (IES)',
+            'CARÁCTER IES',
+            'PROGRAMA ACADÉMICO',
+            'NIVEL ACADÉMICO',
+            'MODALIDAD',
+            'CÓDIGO DEL DEPARTAMENTO (PROGRAMA)',
+            'DEPARTAMENTO DE OFERTA DEL PROGRAMA',
+            'MUNICIPIO DE OFERTA DEL PROGRAMA',
+            'SEXO',
+            'AÑO',
+            'SEMESTRE'
+        ]
+columnas_metricas = ['INSCRITOS', 'MATRICULADOS', 'ADMITIDOS', 'GRADUADOS']
@@ -0,0 +1,229 @@
+import threading
+import numpy as np
+import pandas as pd
+from datos import CapaDatos
+
+MEDIDAS = ['inscritos', 'matriculados', 'admitidos', 'graduados']
+
+# Dimensiones del cubo: nombre -> (llave en la tabla de hechos, columna de la dimensión).
+# Los nombres son los mismos que usan las consultas del tablero.
+DIMENSIONES = {
+    'anio': ('idTiempo', 'anio'),
+    'semestre': ('idTiempo', 'semestre'),
+    'sexo': ('idEstudiante', 'genero'),
+    'nivel_academico': ('idAcademico', 'nivelEducativo'),
+    'modalidad': ('idAcademico', 'modalidad'),
+    'nombre_programa': ('idAcademico', 'programaAcademico'),
+    'institucion': ('idInstitucion', 'nombreInstitucion'),
+    'codigo_departamento': ('idInstitucion', 'codigoDepartamento'),
+    'nombre_departamento': ('idInstitucion', 'nombreDepartamento'),
+}
+
+# Miembros de cada llave de la tabla de hechos, con las columnas de DIMENSIONES
+CONSULTAS_DIMENSIONES = {
+    'idTiempo': "SELECT idTiempo AS id, anio, semestre FROM DimensionTemporal",
+    'idEstudiante': "SELECT idEstudiante AS id, genero FROM DimensionEstudiantes",
+    'idAcademico': "SELECT idAcademico AS id, nivelEducativo, programaAcademico, modalidad FROM DimensionAcademica",
+    'idInstitucion': """
+        SELECT i.idInstitucion AS id, i.nombreInstitucion, d.codigoDepartamento, d.nombreDepartamento
+        FROM DimensionInstitucion i
+        LEFT JOIN DimensionDepartamento d ON i.idInstitucionDpto = d.idDepartamento
+    """,
+}
+
+# Número máximo de celdas para agregar con un solo bincount; con más se usan solo los grupos presentes
+MAX_CELDAS = 1 << 24
+
+class Cubo:
+    """
+    Cubo OLAP en memoria sobre el modelo estrella.
+
+    La tabla de hechos se carga una vez como arreglos de NumPy: por cada
+    dimensión, el código entero del miembro de cada hecho (-1 si el hecho no
+    tiene miembro, como lo descartaría un JOIN), y por cada medida sus valores.
+    Las consultas agrupan y filtran por cualquier combinación de dimensiones
+    con np.bincount, sin volver a la base. Los hechos se guardan ordenados por
+    institución, de modo que filtrar una institución es tomar un tramo contiguo.
+    """
+    def __init__(self, codigos, categorias, medidas):
+        self.codigos = codigos
+        self.categorias = categorias
+        self.medidas = medidas
+        self._posiciones = {
+            dimension: {valor: i for i, valor in enumerate(valores)} for dimension, valores in categorias.items()
+        }
+        # Dimensiones con hechos sin miembro, que hay que descartar al agrupar por ellas
+        self._incompletas = {dimension for dimension, valores in codigos.items() if len(valores) and valores.min() < 0}
+        # Inicio del tramo de cada institución; solo es válido si los hechos están ordenados por ella
+        institucion = codigos['institucion']
+        if len(institucion) and np.all(institucion[:-1] <= institucion[1:]):
+            self._tramos = np.searchsorted(institucion, np.arange(len(categorias['institucion']) + 1))
+        else:
+            self._tramos = None
+
+    @classmethod
+    def desde_base(cls, backend):
+        """Carga el cubo desde la base usando un backend de consultas (ver backend.py)."""
+        hechos = backend.read(f"SELECT idTiempo, idEstudiante, idAcademico, idInstitucion, {', '.join(MEDIDAS)} FROM TablaHechosSNIES")
+        codigos, categorias = {}, {}
+        for llave, consulta in CONSULTAS_DIMENSIONES.items():
+            miembros = backend.read(consulta)
+            ids = miembros['id'].to_numpy(dtype=np.int64)
+            ids_hechos = hechos[llave].to_numpy(dtype=np.float64, na_value=-1).astype(np.int64)
+            tamano = max(int(ids.max(initial=-1)), int(ids_hechos.max(initial=-1))) + 1
+            for dimension, (llave_dimension, columna) in DIMENSIONES.items():
+                if llave_dimension != llave:
+                    continue
+                # Los códigos siguen el orden de los valores (nulos primero, como en SQLite), así
+                # que ordenar por código es ordenar por valor
+                codigos_miembros, valores = pd.factorize(miembros[columna], use_na_sentinel=False)
+                orden = pd.Series(valores).sort_values(na_position='first', kind='stable').index.to_numpy()
+                rango = np.empty(len(orden), dtype=np.int32)
+                rango[orden] = np.arange(len(orden), dtype=np.int32)
+                busqueda = np.full(tamano, -1, dtype=np.int32)
+                busqueda[ids] = rango[codigos_miembros]
+                codigos[dimension] = np.where(ids_hechos >= 0, busqueda[np.maximum(ids_hechos, 0)], -1).astype(np.int32)
+                categorias[dimension] = np.asarray(valores)[orden]
+        # Las medidas se guardan como float64, el tipo de los pesos de np.bincount; las sumas
+        # son exactas mientras no superen 2**53
+        medidas = {medida: hechos[medida].to_numpy(dtype=np.float64, na_value=0) for medida in MEDIDAS}
+
+        orden = np.argsort(codigos['institucion'], kind='stable')
+        return cls(
+            {dimension: valores[orden] for dimension, valores in codigos.items()},
+            categorias,
+            {medida: valores[orden] for medida, valores in medidas.items()},
+        )
+
+    def __len__(self):
+        return len(self.codigos['institucion'])
+
+    def valores(self, dimension):
+        """Miembros de una dimensión, en el orden de sus códigos."""
+        return list(self.categorias[dimension])
+
+    def filtrar(self, filtros):
+        """
+        Retorna un sub-cubo con los hechos que cumplen `filtros` (slice/dice).
+        `filtros` es un diccionario dimensión -> valor o lista de valores.
+        """
+        filas = self._filas(filtros, [])
+        return Cubo(
+            {dimension: valores[filas] for dimension, valores in self.codigos.items()},
+            self.categorias,
+            {medida: valores[filas] for medida, valores in self.medidas.items()},
+        )
+
+    def agregar(self, por, filtros=None, medidas=MEDIDAS):
+        """
+        Suma las medidas agrupando por las dimensiones de `por`, sobre los hechos
+        que cumplen `filtros`. Equivale a un SUM ... GROUP BY sobre el modelo
+        estrella: solo aparecen los grupos con hechos, ordenados por `por`.
+        Para bajar de nivel (drill-down) basta con agregar dimensiones a `por`.
+        """
+        filtros = filtros or {}
+        filas = self._filas(filtros, por)
+        codigos = [self.codigos[dimension][filas] for dimension in por]
+        tamanos = [len(self.categorias[dimension]) for dimension in por]
+
+        # Código del grupo de cada hecho, combinando los códigos de cada dimensión
+        grupo = np.zeros(len(codigos[0]) if codigos else self._contar(filas), dtype=np.int64)
+        for codigos_dimension, tamano in zip(codigos, tamanos):
+            grupo = grupo * tamano + codigos_dimension
+        celdas = int(np.prod(tamanos, dtype=np.float64))
+        if celdas > MAX_CELDAS:
+            presentes, grupo = np.unique(grupo, return_inverse=True)
+            celdas = len(presentes)
+        else:
+            presentes = None
+
+        conteo = np.bincount(grupo, minlength=celdas)
+        con_hechos = np.flatnonzero(conteo)
+        resultado = {}
+        celdas_grupo = con_hechos if presentes is None else presentes[con_hechos]
+        for dimension, codigo in zip(por, np.unravel_index(celdas_grupo, tamanos) if por else []):
+            resultado[dimension] = self.categorias[dimension][codigo]
+        for medida in medidas:
+            sumas = np.bincount(grupo, weights=self.medidas[medida][filas], minlength=celdas)
+            resultado[medida] = sumas[con_hechos].astype(np.int64)
+
+        # Los grupos salen ordenados por código, que es el orden de los valores de `por`
+        return pd.DataFrame(resultado)
+
+    def _contar(self, filas):
+        return len(self.codigos['institucion'][filas])
+
+    def _filas(self, filtros, por):
+        """Selección de hechos que cumplen los filtros y tienen miembro en las dimensiones usadas."""
+        inicio, fin = 0, len(self)
+        filtros = dict(filtros)
+        institucion = filtros.get('institucion')
+        if self._tramos is not None and 'institucion' in filtros and not isinstance(institucion, (list, tuple, set)):
+            # Una sola institución: su tramo contiguo, sin recorrer los demás hechos
+            del filtros['institucion']
+            codigo = self._posiciones['institucion'].get(institucion)
+            if codigo is None:
+                return slice(0, 0)
+            inicio, fin = self._tramos[codigo], self._tramos[codigo + 1]
+
+        condiciones = []
+        for dimension, valor in filtros.items():
+            valores = valor if isinstance(valor, (list, tuple, set)) else [valor]
+            codigos = [self._posiciones[dimension][v] for v in valores if v in self._posiciones[dimension]]
+            tramo = self.codigos[dimension][inicio:fin]
+            condiciones.append(tramo == codigos[0] if len(codigos) == 1 else np.isin(tramo, codigos))
+        for dimension in por:
+            if dimension in self._incompletas:
+                condiciones.append(self.codigos[dimension][inicio:fin] >= 0)
+        if not condiciones:
+            return slice(inicio, fin)
+        return np.flatnonzero(np.logical_and.reduce(condiciones)) + inicio
+
+class DatosCubo(CapaDatos):
+    """
+    Capa de datos del tablero servida desde un Cubo en memoria. Arma cada
+    agregado con Cubo.agregar; el cubo se vuelve a cargar cuando cambia la
+    versión de los datos del backend.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._version = None
+        self.cubo = None
+        self._globales = {}
+        self._vigente()
+
+    def instituciones(self):
+        # Los miembros de la dimensión incluyen instituciones sin hechos; agregar solo retorna grupos con hechos
+        instituciones = self._vigente().agregar(['institucion'], medidas=[])['institucion']
+        return [institucion for institucion in instituciones if not pd.isna(institucion)]
+
+    def obtener(self, clave):
+        cubo = self._vigente()
+        institucion = clave['institucion']
+        return {
+            'programas': cubo.agregar(['institucion', 'nombre_programa', 'sexo'],
+                                      {'institucion': institucion, 'nivel_academico': 'Pregrado'}),
+            'nivel_modalidad': self._global(cubo, ('institucion', 'nivel_academico', 'modalidad')),
+            'nivel_genero': cubo.agregar(['institucion', 'nivel_academico', 'sexo'], {'institucion': institucion}),
+            'departamentos': cubo.agregar(['institucion', 'codigo_departamento', 'nombre_departamento'],
+                                          {'institucion': institucion}),
+        }
+
+    def _global(self, cubo, por):
+        # Los agregados sin filtro de institución son iguales para todas; se calculan una vez por cubo
+        llave = (id(cubo), por)
+        df = self._globales.get(llave)
+        if df is None:
+            df = self._globales[llave] = cubo.agregar(list(por))
+        return df
+
+    def _vigente(self):
+        version = self.backend.version()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self.cubo = Cubo.desde_base(self.backend)
+                    self._globales = {}
+                    self._version = version
+        return self.cubo
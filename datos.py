@@ -0,0 +1,175 @@
+import operator
+import re
+import pandas as pd
+from cache import QueryCache
+from queries import cantidadesPrograma, instituciones, query2, query4, query_map
+
+# Columnas de la tabla de programas y las que se pueden ordenar y filtrar desde el tablero
+COLUMNAS_TABLA = ['institucion', 'nombre_programa', 'sexo', 'inscritos', 'matriculados', 'admitidos', 'graduados']
+COLUMNAS_NUMERICAS = {'inscritos', 'matriculados', 'admitidos', 'graduados'}
+
+# Operadores de filter_query de Dash y su equivalente en SQL
+OPERADORES = {
+    '=': '=', 'eq': '=', '!=': '!=', 'ne': '!=',
+    '<': '<', 'lt': '<', '<=': '<=', 'le': '<=',
+    '>': '>', 'gt': '>', '>=': '>=', 'ge': '>=',
+}
+COMPARACIONES = {
+    '=': operator.eq, '!=': operator.ne, '<': operator.lt,
+    '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+}
+TERMINO = re.compile(r"^\{(?P<columna>[^}]+)\}\s+(?P<operador>[si]?contains|[si]?(?:eq|ne|lt|le|gt|ge)|!=|<=|>=|=|<|>)\s+(?P<valor>.+)$")
+
+def terminos_filtro(filter_query, columnas=COLUMNAS_TABLA):
+    """
+    Separa el filter_query de una DataTable de Dash en términos
+    (columna, operador, valor, insensible). Solo se aceptan columnas de
+    `columnas`; los términos que no se reconocen se ignoran.
+    """
+    for termino in (filter_query or '').split(' && '):
+        encontrado = TERMINO.match(termino.strip())
+        if encontrado is None or encontrado['columna'] not in columnas:
+            continue
+        columna, operador, valor = encontrado['columna'], encontrado['operador'], encontrado['valor'].strip()
+        if len(valor) >= 2 and valor[0] == valor[-1] and valor[0] in '"\'`':
+            valor = valor[1:-1]
+        # Los prefijos s/i indican comparación sensible o insensible a mayúsculas
+        insensible = operador[0] == 'i'
+        if operador[0] in 'si':
+            operador = operador[1:]
+        if columna in COLUMNAS_NUMERICAS and operador != 'contains':
+            try:
+                valor = float(valor)
+            except ValueError:
+                continue
+        yield columna, operador, valor, insensible
+
+def filtro_sql(filter_query, columnas=COLUMNAS_TABLA):
+    """Traduce el filter_query de una DataTable de Dash a condiciones SQL con parámetros."""
+    condiciones, params = [], []
+    for columna, operador, valor, insensible in terminos_filtro(filter_query, columnas):
+        if operador == 'contains':
+            if insensible:
+                condiciones.append(f"instr(lower(CAST({columna} AS TEXT)), lower(?)) > 0")
+            else:
+                condiciones.append(f"instr(CAST({columna} AS TEXT), ?) > 0")
+            params.append(str(valor))
+        elif insensible and isinstance(valor, str):
+            condiciones.append(f"lower({columna}) {OPERADORES[operador]} lower(?)")
+            params.append(valor)
+        else:
+            condiciones.append(f"{columna} {OPERADORES[operador]} ?")
+            params.append(valor)
+    return condiciones, params
+
+def filtro_pandas(df, filter_query, columnas=COLUMNAS_TABLA):
+    """Aplica el filter_query de una DataTable de Dash a un DataFrame en memoria."""
+    mascara = pd.Series(True, index=df.index)
+    for columna, operador, valor, insensible in terminos_filtro(filter_query, columnas):
+        serie = df[columna]
+        if operador == 'contains':
+            serie, valor = serie.astype(str), str(valor)
+        if insensible and isinstance(valor, str):
+            serie, valor = serie.str.lower(), valor.lower()
+        if operador == 'contains':
+            mascara &= serie.str.contains(valor, regex=False)
+        else:
+            mascara &= COMPARACIONES[OPERADORES[operador]](serie, valor)
+    return df[mascara]
+
+def orden_sql(sort_by, columnas=COLUMNAS_TABLA):
+    """Traduce el sort_by de una DataTable de Dash a un ORDER BY sobre columnas permitidas."""
+    orden = [
+        f"{criterio['column_id']} {'DESC' if criterio.get('direction') == 'desc' else 'ASC'}"
+        for criterio in sort_by or []
+        if criterio.get('column_id') in columnas
+    ]
+    # El orden original desempata, para que las páginas sean estables
+    return ', '.join(orden + ['nombre_programa', 'sexo'])
+
+def orden_pandas(df, sort_by, columnas=COLUMNAS_TABLA):
+    """Ordena un DataFrame en memoria como lo haría orden_sql."""
+    criterios = [c for c in sort_by or [] if c.get('column_id') in columnas]
+    return df.sort_values(
+        [c['column_id'] for c in criterios] + ['nombre_programa', 'sexo'],
+        ascending=[c.get('direction') != 'desc' for c in criterios] + [True, True],
+        kind='stable',
+    )
+
+def pagina_dataframe(df, pagina, tamano, sort_by=None, filter_query=''):
+    """Filtra, ordena y pagina en memoria una tabla de programas; retorna la página y el total de filas."""
+    df = orden_pandas(filtro_pandas(df, filter_query), sort_by)
+    return df.iloc[pagina * tamano:(pagina + 1) * tamano].reset_index(drop=True), len(df)
+
+class CapaDatos:
+    """
+    Interfaz común de las capas de datos del tablero (DatosTablero, DatosCubo y
+    DatosSnapshot).
+
+    Cada capa arma de una sola vez todos los agregados que necesitan las
+    gráficas para una institución y los guarda en el servidor, de modo que los
+    callbacks comparten los mismos DataFrames en lugar de consultar cada uno por
+    su lado. Los DataFrames retornados son compartidos y no deben modificarse.
+    Las capas implementan `instituciones` y `obtener`; `pagina_programas` pagina
+    en memoria salvo que la capa pueda hacerlo mejor.
+    """
+    backend = None
+
+    def version(self):
+        """Versión actual de los datos, como texto para guardarla en un dcc.Store."""
+        return repr(self.backend.version())
+
+    def clave(self, institucion):
+        """Llave que identifica los agregados de una institución en la versión actual de los datos."""
+        return {'institucion': institucion, 'version': self.version()}
+
+    def instituciones(self):
+        """Nombres de las instituciones con datos, en orden alfabético."""
+        raise NotImplementedError
+
+    def obtener(self, clave):
+        """Retorna los agregados de la institución indicada en la llave."""
+        raise NotImplementedError
+
+    def pagina_programas(self, clave, pagina, tamano, sort_by=None, filter_query=''):
+        """Retorna una página de la tabla de programas y el total de filas que cumplen el filtro."""
+        return pagina_dataframe(self.obtener(clave)['programas'], pagina, tamano, sort_by, filter_query)
+
+class DatosTablero(CapaDatos):
+    """Capa de datos del tablero que consulta la base a través de un backend."""
+    def __init__(self, backend):
+        # Motor que ejecuta las consultas (ver backend.py)
+        self.backend = backend
+        # Resultados de consultas compartidos entre callbacks; se invalidan al recargar la base
+        self.query_cache = QueryCache(backend.version)
+
+    def instituciones(self):
+        return self.read_query(instituciones, name='instituciones')['institucion'].tolist()
+
+    def obtener(self, clave):
+        institucion = clave['institucion']
+        return {
+            'programas': self.read_query(cantidadesPrograma, (institucion,), 'cantidadesPrograma'),
+            'nivel_modalidad': self.read_query(query2, name='query2'),
+            'nivel_genero': self.read_query(query4, (institucion,), 'query4'),
+            'departamentos': self.read_query(query_map, (institucion,), 'query_map'),
+        }
+
+    def pagina_programas(self, clave, pagina, tamano, sort_by=None, filter_query=''):
+        # El ordenamiento, el filtro y la paginación se resuelven en SQL, así que solo viaja la página pedida
+        condiciones, params = filtro_sql(filter_query)
+        where = ' AND '.join(["institucion = ?", "nivel_academico = 'Pregrado'"] + condiciones)
+        params = [clave['institucion']] + params
+
+        total = self.read_query(f"SELECT COUNT(*) AS total FROM ResumenProgramaGenero WHERE {where}", params, 'pagina_programas_total')
+        pagina_df = self.read_query(
+            f"SELECT {', '.join(COLUMNAS_TABLA)} FROM ResumenProgramaGenero WHERE {where} "
+            f"ORDER BY {orden_sql(sort_by)} LIMIT ? OFFSET ?",
+            params + [tamano, pagina * tamano],
+            'pagina_programas',
+        )
+        return pagina_df, int(total['total'].iloc[0])
+
+    def read_query(self, query, params=(), name='consulta'):
+        """Ejecuta una consulta del tablero usando el caché de resultados."""
+        return self.query_cache.read(query, params, self.backend.read, name)
@@ -0,0 +1,115 @@
+import json
+import os
+import sys
+from functools import lru_cache
+from urllib.request import urlopen
+import numpy as np
+
+# Origen de la geometría de los departamentos de Colombia y copia local que usa el tablero
+GEOJSON_URL = "https://gist.githubusercontent.com/john-guerra/43c7656821069d00dcbc/raw/be6a6e239cd5b5b803c6e7c2ec405b793a9064dd/Colombia.geo.json"
+GEOJSON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'colombia.geo.json')
+
+# Propiedades de cada departamento que se conservan; el resto no lo usa el mapa
+PROPIEDADES = ['DPTO', 'NOMBRE_DPT']
+
+def descargar_geojson(url=GEOJSON_URL, ruta=GEOJSON_PATH, tolerancia=0.005, decimales=4):
+    """
+    Descarga la geometría de los departamentos y guarda en la copia local solo
+    lo que usa el mapa, ya simplificado, para que el archivo sea pequeño y se
+    pueda versionar junto al código.
+    """
+    with urlopen(url, timeout=60) as respuesta:
+        geojson = json.load(respuesta)
+    with open(ruta + '.tmp', 'w', encoding='utf-8') as archivo:
+        json.dump(_simplificar_coleccion(geojson, tolerancia, decimales), archivo, ensure_ascii=False, separators=(',', ':'))
+    os.replace(ruta + '.tmp', ruta)
+    return ruta
+
+def simplificar_linea(puntos, tolerancia):
+    """
+    Simplifica una línea con el algoritmo de Douglas-Peucker: descarta los
+    vértices que están a menos de `tolerancia` (en grados) del segmento que
+    los aproxima. Los extremos siempre se conservan.
+    """
+    n = len(puntos)
+    if n < 3 or tolerancia <= 0:
+        return puntos
+    conservar = np.zeros(n, dtype=bool)
+    conservar[0] = conservar[-1] = True
+    pendientes = [(0, n - 1)]
+    while pendientes:
+        inicio, fin = pendientes.pop()
+        if fin - inicio < 2:
+            continue
+        a, b = puntos[inicio], puntos[fin]
+        tramo = puntos[inicio + 1:fin]
+        segmento = b - a
+        largo = np.hypot(*segmento)
+        if largo == 0:
+            distancias = np.hypot(*(tramo - a).T)
+        else:
+            distancias = np.abs(segmento[0] * (tramo[:, 1] - a[1]) - segmento[1] * (tramo[:, 0] - a[0])) / largo
+        mayor = int(np.argmax(distancias))
+        if distancias[mayor] > tolerancia:
+            medio = inicio + 1 + mayor
+            conservar[medio] = True
+            pendientes.append((inicio, medio))
+            pendientes.append((medio, fin))
+    return puntos[conservar]
+
+def simplificar_anillo(anillo, tolerancia, decimales):
+    """Simplifica un anillo cerrado de un polígono; si quedaría degenerado se deja completo."""
+    puntos = np.asarray(anillo, dtype=float)[:, :2]
+    simplificado = simplificar_linea(puntos, tolerancia)
+    if len(simplificado) < 4:
+        simplificado = puntos
+    return np.round(simplificado, decimales).tolist()
+
+def simplificar_geometria(geometria, tolerancia, decimales=4):
+    """Simplifica un Polygon o MultiPolygon de GeoJSON."""
+    if geometria['type'] == 'Polygon':
+        poligonos = [geometria['coordinates']]
+    elif geometria['type'] == 'MultiPolygon':
+        poligonos = geometria['coordinates']
+    else:
+        return geometria
+    simplificados = [[simplificar_anillo(anillo, tolerancia, decimales) for anillo in poligono] for poligono in poligonos]
+    if geometria['type'] == 'Polygon':
+        return {'type': 'Polygon', 'coordinates': simplificados[0]}
+    return {'type': 'MultiPolygon', 'coordinates': simplificados}
+
+@lru_cache(maxsize=None)
+def cargar_geojson(ruta=GEOJSON_PATH, tolerancia=0.005, decimales=4):
+    """
+    Lee la copia local de la geometría de los departamentos, la simplifica con
+    la tolerancia indicada y la deja en memoria. Cada combinación de parámetros
+    se lee una sola vez por proceso.
+    """
+    with open(ruta, encoding='utf-8') as archivo:
+        geojson = json.load(archivo)
+    return _simplificar_coleccion(geojson, tolerancia, decimales)
+
+def _simplificar_coleccion(geojson, tolerancia, decimales):
+    return {
+        'type': 'FeatureCollection',
+        'features': [
+            {
+                'type': 'Feature',
+                'properties': {k: feature['properties'][k] for k in PROPIEDADES if k in feature['properties']},
+                'geometry': simplificar_geometria(feature['geometry'], tolerancia, decimales),
+            }
+            for feature in geojson['features']
+        ],
+    }
+
+def departamentos(geojson, codigos):
+    """Retorna solo los departamentos de `codigos`, que son los únicos que dibuja el mapa."""
+    codigos = {str(codigo) for codigo in codigos}
+    return {
+        'type': 'FeatureCollection',
+        'features': [f for f in geojson['features'] if str(f['properties'].get('DPTO')) in codigos],
+    }
+
+if __name__ == '__main__':
+    # Uso: python geografia.py [url]
+    print(descargar_geojson(sys.argv[1] if len(sys.argv) > 1 else GEOJSON_URL))
@@ -0,0 +1,209 @@
+import cProfile
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+import pandas as pd
+
+# Con SNIES_METRICAS=0 no se registra nada y los decoradores retornan la función original
+ACTIVAS = os.environ.get('SNIES_METRICAS', '1') != '0'
+# Carpeta donde se guardan los perfiles de cProfile de los callbacks lentos; sin ella no se perfila
+PERFIL_DIR = os.environ.get('SNIES_PERFIL_DIR')
+# Duración en segundos a partir de la cual un callback se considera lento
+PERFIL_UMBRAL = float(os.environ.get('SNIES_PERFIL_UMBRAL', '0.5'))
+
+# Límites de los buckets de los histogramas de duración, en segundos
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+AYUDAS = {
+    'snies_callback_segundos': "Duración de los callbacks del tablero",
+    'snies_callback_errores_total': "Callbacks del tablero que terminaron con una excepción",
+    'snies_consulta_segundos': "Duración de las consultas SQL del tablero",
+    'snies_consulta_filas_total': "Filas retornadas por las consultas SQL del tablero",
+    'snies_consulta_cache_total': "Lecturas del caché de consultas, por resultado",
+    'snies_respuesta_cache_total': "Respuestas de callbacks servidas desde el caché, por resultado",
+    'snies_etl_segundos': "Duración de las etapas del cargue",
+    'snies_etl_filas_total': "Filas procesadas por las etapas del cargue",
+}
+
+class Registro:
+    """
+    Contadores e histogramas en memoria, identificados por nombre y etiquetas.
+    Es seguro para usarse desde varios hilos y se exporta en el formato de texto de Prometheus.
+    """
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._contadores = {}
+        self._histogramas = {}
+        self._lock = threading.Lock()
+
+    def contar(self, nombre, valor=1, **etiquetas):
+        """Suma `valor` al contador `nombre` con las etiquetas dadas."""
+        llave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            self._contadores[llave] = self._contadores.get(llave, 0) + valor
+
+    def observar(self, nombre, valor, **etiquetas):
+        """Registra una observación en el histograma `nombre` con las etiquetas dadas."""
+        llave = (nombre, tuple(sorted(etiquetas.items())))
+        posicion = bisect_left(self.buckets, valor)
+        with self._lock:
+            histograma = self._histogramas.get(llave)
+            if histograma is None:
+                histograma = self._histogramas[llave] = [[0] * (len(self.buckets) + 1), 0.0]
+            histograma[0][posicion] += 1
+            histograma[1] += valor
+
+    def limpiar(self):
+        """Descarta todas las métricas registradas."""
+        with self._lock:
+            self._contadores.clear()
+            self._histogramas.clear()
+
+    def exponer(self):
+        """Retorna las métricas en el formato de texto de Prometheus."""
+        with self._lock:
+            contadores = sorted(self._contadores.items())
+            histogramas = sorted((llave, (list(conteos), suma)) for llave, (conteos, suma) in self._histogramas.items())
+
+        lineas = []
+        anterior = None
+        for (nombre, etiquetas), valor in contadores:
+            if nombre != anterior:
+                lineas += self._encabezado(nombre, 'counter')
+                anterior = nombre
+            lineas.append(f"{nombre}{_etiquetas(etiquetas)} {valor}")
+        for (nombre, etiquetas), (conteos, suma) in histogramas:
+            if nombre != anterior:
+                lineas += self._encabezado(nombre, 'histogram')
+                anterior = nombre
+            acumulado = 0
+            for limite, conteo in zip(self.buckets + ('+Inf',), conteos):
+                acumulado += conteo
+                lineas.append(f"{nombre}_bucket{_etiquetas(etiquetas + (('le', str(limite)),))} {acumulado}")
+            lineas.append(f"{nombre}_sum{_etiquetas(etiquetas)} {suma}")
+            lineas.append(f"{nombre}_count{_etiquetas(etiquetas)} {acumulado}")
+        return '\n'.join(lineas) + '\n'
+
+    def _encabezado(self, nombre, tipo):
+        ayuda = [f"# HELP {nombre} {AYUDAS[nombre]}"] if nombre in AYUDAS else []
+        return ayuda + [f"# TYPE {nombre} {tipo}"]
+
+def _etiquetas(etiquetas):
+    if not etiquetas:
+        return ''
+    escapar = lambda valor: str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{nombre}="{escapar(valor)}"' for nombre, valor in etiquetas) + '}'
+
+# Registro compartido por todo el proceso
+registro = Registro()
+
+def contar(nombre, valor=1, **etiquetas):
+    """Suma `valor` a un contador del registro compartido."""
+    if ACTIVAS:
+        registro.contar(nombre, valor, **etiquetas)
+
+@contextmanager
+def medir(nombre, **etiquetas):
+    """Registra la duración del bloque with en un histograma del registro compartido."""
+    if not ACTIVAS:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registro.observar(nombre, time.perf_counter() - inicio, **etiquetas)
+
+def callback(funcion):
+    """
+    Instrumenta un callback del tablero: duración, errores y, si PERFIL_DIR
+    está definido, un volcado de cProfile cuando tarda más de PERFIL_UMBRAL.
+    """
+    if not ACTIVAS:
+        return funcion
+    nombre = funcion.__name__
+
+    @wraps(funcion)
+    def instrumentado(*args, **kwargs):
+        perfil = _iniciar_perfil()
+        inicio = time.perf_counter()
+        try:
+            return funcion(*args, **kwargs)
+        except Exception:
+            registro.contar('snies_callback_errores_total', callback=nombre)
+            raise
+        finally:
+            duracion = time.perf_counter() - inicio
+            registro.observar('snies_callback_segundos', duracion, callback=nombre)
+            if perfil is not None:
+                _terminar_perfil(perfil, nombre, duracion)
+    return instrumentado
+
+def etapa_etl(nombre):
+    """
+    Instrumenta una etapa del cargue: registra su duración y las filas del
+    DataFrame que produce o, si no retorna uno, del DataFrame que recibe.
+    """
+    def decorador(funcion):
+        if not ACTIVAS:
+            return funcion
+
+        @wraps(funcion)
+        def instrumentado(*args, **kwargs):
+            with medir('snies_etl_segundos', etapa=nombre):
+                resultado = funcion(*args, **kwargs)
+            procesado = resultado if isinstance(resultado, pd.DataFrame) else next(
+                (arg for arg in args if isinstance(arg, pd.DataFrame)), None)
+            if procesado is not None:
+                registro.contar('snies_etl_filas_total', len(procesado), etapa=nombre)
+            return resultado
+        return instrumentado
+    return decorador
+
+def consulta(nombre, df, duracion):
+    """Registra una consulta SQL ejecutada: su duración y las filas que retornó."""
+    if ACTIVAS:
+        registro.observar('snies_consulta_segundos', duracion, consulta=nombre)
+        registro.contar('snies_consulta_filas_total', len(df), consulta=nombre)
+
+def registrar_endpoint(server, ruta='/metrics'):
+    """Publica las métricas del proceso en `ruta` del servidor Flask, si están activas."""
+    if not ACTIVAS:
+        return
+    from flask import Response
+
+    def metricas():
+        return Response(registro.exponer(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    server.add_url_rule(ruta, 'metricas', metricas)
+
+def volcar(ruta):
+    """Escribe las métricas del proceso en un archivo de texto, por ejemplo al final de un cargue."""
+    if ACTIVAS and ruta:
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            archivo.write(registro.exponer())
+
+def _iniciar_perfil():
+    if not PERFIL_DIR:
+        return None
+    perfil = cProfile.Profile()
+    try:
+        perfil.enable()
+    except ValueError:
+        # Ya hay otro perfilador activo (por ejemplo, otro callback en paralelo)
+        return None
+    return perfil
+
+def _terminar_perfil(perfil, nombre, duracion):
+    perfil.disable()
+    if duracion < PERFIL_UMBRAL:
+        return
+    marca = time.strftime('%Y%m%d-%H%M%S')
+    try:
+        os.makedirs(PERFIL_DIR, exist_ok=True)
+        perfil.dump_stats(os.path.join(PERFIL_DIR, f"{nombre}-{marca}-{int(duracion * 1000)}ms-{threading.get_ident()}.prof"))
+    except OSError:
+        # Un perfil que no se puede guardar no debe hacer fallar el callback
+        pass
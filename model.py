@@ -1,17 +1,109 @@
+import hashlib
+import itertools
+import json
+import os
+import shutil
 import sqlite3
+import tempfile
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import openpyxl
 import pandas as pd
+try:
+    import pyarrow
+    import pyarrow.parquet as pq
+except ImportError:
+    pyarrow = None
+from cache import LRUCache
+from metricas import etapa_etl
+from pandas.api.types import union_categoricals
 from constant import columnas_requeridas_A, columnas_requeridas_G, columnas_requeridas_I, columnas_requeridas_M
+from constant import columnas_categoricas, columnas_metricas
+from queries import ROLLUPS
+
+# Columnas que identifican una partición del cargue incremental
+columnas_particion = ['AÑO', 'SEMESTRE', 'INSTITUCIÓN DE EDUCACIÓN SUPERIOR (IES)']
+
+def file_hash(nombre_archivo):
+    """Calcula el hash SHA-256 del contenido de un archivo."""
+    digest = hashlib.sha256()
+    with open(nombre_archivo, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(1 << 20), b''):
+            digest.update(bloque)
+    return digest.hexdigest()
+
+def _partition_hash(df):
+    """Calcula un hash del contenido de una partición que no depende del orden de las filas."""
+    filas = np.sort(pd.util.hash_pandas_object(df, index=False).to_numpy())
+    return hashlib.sha256(filas.tobytes()).hexdigest()
+
+def filter_hash(codigo_institucion):
+    """Calcula un hash del filtro de instituciones de un cargue, sin importar su orden."""
+    if codigo_institucion is None:
+        codigos = None
+    elif isinstance(codigo_institucion, (list, tuple, set)):
+        codigos = sorted(str(codigo) for codigo in codigo_institucion)
+    else:
+        codigos = [str(codigo_institucion)]
+    return hashlib.sha256(json.dumps(codigos, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def _excel_text(valor):
+    """Convierte una celda a texto como lo hace pd.read_excel con dtype=str."""
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor)
+
+def _integer_affinity(valor):
+    """Replica la conversión que SQLite aplica a los valores de una columna INTEGER."""
+    if isinstance(valor, str):
+        return valor
+    if float(valor).is_integer():
+        return int(valor)
+    return float(valor)
 
 class Database:
-    def __init__(self, db_name='snies.db'):
+    # Llave natural de cada dimensión: tabla -> (llave subrogada, columnas naturales)
+    NATURAL_KEYS = {
+        'DimensionDepartamento': ('idDepartamento', ['nombreDepartamento', 'codigoDepartamento']),
+        'DimensionInstitucion': ('idInstitucion', ['nombreInstitucion', 'tipoInstitucion', 'idInstitucionDpto']),
+        'DimensionMunicipio': ('idMunicipio', ['nombreMunicipio', 'codigoMunicipio', 'idMunicipioDpto']),
+        'DimensionTemporal': ('idTiempo', ['anio', 'semestre']),
+        'DimensionEstudiantes': ('idEstudiante', ['genero']),
+        'DimensionAcademica': ('idAcademico', ['nivelEducativo', 'programaAcademico', 'modalidad']),
+    }
+
+    # Columnas que referencian a cada dimensión: tabla -> [(tabla que referencia, columna)]
+    REFERENCES = {
+        'DimensionDepartamento': [('DimensionInstitucion', 'idInstitucionDpto'), ('DimensionMunicipio', 'idMunicipioDpto')],
+        'DimensionInstitucion': [('TablaHechosSNIES', 'idInstitucion')],
+        'DimensionMunicipio': [],
+        'DimensionTemporal': [('TablaHechosSNIES', 'idTiempo')],
+        'DimensionEstudiantes': [('TablaHechosSNIES', 'idEstudiante')],
+        'DimensionAcademica': [('TablaHechosSNIES', 'idAcademico')],
+    }
+
+    # Tablas del modelo estrella, en el orden en que se exportan
+    STAR_TABLES = list(NATURAL_KEYS) + ['TablaHechosSNIES']
+
+    def __init__(self, db_name='snies.db', key_cache_size=100000, batch_size=50000):
         self.db_name = db_name
         self.connection = None
         self.cursor = None
+        # Cantidad de hechos que se escriben entre confirmaciones en los cargues por lotes
+        self.batch_size = batch_size
+        # Caché llave natural -> llave subrogada para insert_dimension_data
+        self.key_cache = LRUCache(key_cache_size)
 
     def connect(self):
-        """Conectar a la base de datos y crear un cursor."""
-        self.connection = sqlite3.connect(self.db_name)
+        """
+        Conectar a la base de datos y crear un cursor.
+        La base usa modo WAL, de modo que el tablero puede seguir leyendo mientras se carga.
+        """
+        self.connection = sqlite3.connect(self.db_name, timeout=30)
         self.cursor = self.connection.cursor()
+        self.cursor.execute("PRAGMA journal_mode=WAL")
+        self.cursor.execute("PRAGMA synchronous=NORMAL")
 
     def close(self):
         """Cerrar la conexión a la base de datos."""
@@ -102,13 +194,184 @@ class Database:
         )
         ''')
 
+        self.create_natural_key_indexes()
+
+        # Índices de la tabla de hechos. Los de institución y programa académico
+        # incluyen las medidas para que las agregaciones del tablero no lean la tabla.
+        self.cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_hechos_institucion ON TablaHechosSNIES (
+            idInstitucion, idAcademico, idEstudiante, inscritos, matriculados, admitidos, graduados
+        )
+        ''')
+        self.cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_hechos_academico ON TablaHechosSNIES (
+            idAcademico, idInstitucion, idEstudiante, inscritos, matriculados, admitidos, graduados
+        )
+        ''')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_hechos_tiempo ON TablaHechosSNIES (idTiempo)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_hechos_estudiante ON TablaHechosSNIES (idEstudiante)')
+
+        # Versión de los datos publicados; build_rollups la incrementa en la misma
+        # transacción en que publica las tablas de resumen (ver queries.version_datos)
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS VersionDatos (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+        ''')
+        self.cursor.execute("INSERT OR IGNORE INTO VersionDatos (id, version) VALUES (1, 0)")
+
+        # Las tablas de resumen se construyen solo si faltan; para reconstruirlas
+        # cuando cambian sus consultas se usa migrate_rollups
+        faltantes = self.missing_rollups()
+        if faltantes:
+            self.build_rollups(tablas=faltantes)
+
+        # Control del cargue incremental: particiones cargadas por archivo fuente
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ControlCargue (
+            archivo TEXT,
+            anio INTEGER,
+            semestre INTEGER,
+            institucion TEXT,
+            hashArchivo TEXT,
+            hashParticion TEXT,
+            hashFiltro TEXT,
+            PRIMARY KEY (archivo, anio, semestre, institucion)
+        )
+        ''')
+        # Bases creadas antes de guardar el filtro de instituciones del cargue
+        self.cursor.execute("PRAGMA table_info(ControlCargue)")
+        if 'hashFiltro' not in [fila[1] for fila in self.cursor.fetchall()]:
+            self.cursor.execute("ALTER TABLE ControlCargue ADD COLUMN hashFiltro TEXT")
+
         print("Tablas creadas exitosamente en SQLite.")
         self.close()
+
+    def missing_rollups(self):
+        """Retorna las tablas de resumen de queries.ROLLUPS que aún no existen en la base."""
+        self.cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        existentes = {fila[0] for fila in self.cursor.fetchall()}
+        return [table_name for table_name in ROLLUPS if table_name not in existentes]
+
+    def migrate_rollups(self):
+        """
+        Reconstruye todas las tablas de resumen desde la tabla de hechos. Es el
+        paso de migración cuando cambian las consultas de queries.ROLLUPS; los
+        cargues solo las actualizan.
+        """
+        self.connect()
+        try:
+            self.build_rollups()
+        except Exception:
+            self.connection.rollback()
+            raise
+        finally:
+            self.close()
+
+    def build_rollups(self, instituciones=None, tablas=None):
+        """
+        Reconstruye las tablas de resumen que lee el tablero a partir del
+        modelo estrella, una por cada granularidad definida en queries.ROLLUPS.
+        Si se indican instituciones, solo se recalculan sus filas dentro de la
+        transacción abierta; si se indican tablas, solo se reconstruyen esas.
+
+        La reconstrucción completa arma cada tabla como <tabla>_nuevo y las
+        publica todas en una sola transacción, junto con los hechos aún sin
+        confirmar y una nueva versión de los datos, así que el tablero nunca
+        encuentra una tabla de resumen borrada ni ve un cargue a medias.
+        """
+        tablas = [table_name for table_name in ROLLUPS if tablas is None or table_name in tablas]
+        if instituciones is not None:
+            for table_name in tablas:
+                query = ROLLUPS[table_name][0]
+                query_institucion = query.replace('GROUP BY', 'WHERE i.nombreInstitucion = ?\n    GROUP BY', 1)
+                for institucion in instituciones:
+                    self.cursor.execute(f"DELETE FROM {table_name} WHERE institucion = ?", (institucion,))
+                    self.cursor.execute(f"INSERT INTO {table_name} {query_institucion}", (institucion,))
+            if instituciones:
+                self.publish_version()
+            return
+
+        for table_name in tablas:
+            self.cursor.execute(f"DROP TABLE IF EXISTS {table_name}_nuevo")
+            self.cursor.execute(f"CREATE TABLE {table_name}_nuevo AS {ROLLUPS[table_name][0]}")
+
+        # sqlite3 no abre una transacción antes de DDL; sin ella cada DROP y ALTER se confirmaría por separado
+        if not self.connection.in_transaction:
+            self.cursor.execute("BEGIN IMMEDIATE")
+        for table_name in tablas:
+            self.cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+            self.cursor.execute(f"ALTER TABLE {table_name}_nuevo RENAME TO {table_name}")
+            self.cursor.execute(
+                f"CREATE INDEX idx_{table_name} ON {table_name} ({','.join(ROLLUPS[table_name][1])})"
+            )
+        self.publish_version()
+        self.connection.commit()
+
+    def publish_version(self):
+        """
+        Incrementa la versión de los datos publicados dentro de la transacción
+        abierta. El tablero invalida sus cachés solo cuando cambia, así que los
+        lotes que confirma un cargue en curso no cambian la versión.
+        """
+        self.cursor.execute(
+            "INSERT INTO VersionDatos (id, version) VALUES (1, 1) "
+            "ON CONFLICT (id) DO UPDATE SET version = version + 1"
+        )
+
+    def create_natural_key_indexes(self):
+        """
+        Crea un índice único sobre la llave natural de cada dimensión.
+
+        Si la base de datos fue cargada antes de existir estos índices, primero
+        fusiona los miembros duplicados y reasigna las llaves que los referencian.
+        """
+        for table_name, (id_column, columnas) in self.NATURAL_KEYS.items():
+            index_name = f"uq_{table_name}_natural"
+            self.cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (index_name,))
+            if self.cursor.fetchone():
+                continue
+            self.deduplicate_dimension(table_name, id_column, columnas)
+            self.cursor.execute(f"CREATE UNIQUE INDEX {index_name} ON {table_name} ({','.join(columnas)})")
+        self.key_cache.clear()
+
+    def deduplicate_dimension(self, table_name, id_column, columnas):
+        """
+        Deja un solo miembro por llave natural (el de menor id) en una dimensión
+        y actualiza las tablas que apuntaban a los duplicados eliminados.
+        """
+        self.cursor.execute("DROP TABLE IF EXISTS temp.mapa_duplicados")
+        self.cursor.execute(f'''
+        CREATE TEMP TABLE mapa_duplicados AS
+        SELECT viejo, nuevo FROM (
+            SELECT {id_column} AS viejo,
+                   MIN({id_column}) OVER (PARTITION BY {','.join(columnas)}) AS nuevo
+            FROM {table_name}
+        )
+        WHERE viejo <> nuevo
+        ''')
+        self.cursor.execute("CREATE INDEX temp.idx_mapa_duplicados ON mapa_duplicados (viejo)")
+
+        for referencing_table, column in self.REFERENCES[table_name]:
+            self.cursor.execute(f'''
+            UPDATE {referencing_table}
+            SET {column} = (SELECT nuevo FROM mapa_duplicados WHERE viejo = {referencing_table}.{column})
+            WHERE {column} IN (SELECT viejo FROM mapa_duplicados)
+            ''')
+        self.cursor.execute(f"DELETE FROM {table_name} WHERE {id_column} IN (SELECT viejo FROM mapa_duplicados)")
+        self.cursor.execute("DROP TABLE temp.mapa_duplicados")
     
     def insert_dimension_data(self, cursor, table_name, data):
         """
         Inserta datos en una tabla dimensional y retorna el ID generado.
+        Los miembros ya vistos se resuelven desde el caché sin consultar la base de datos.
         """
+        cache_key = (table_name, tuple(data.items()))
+        cached_id = self.key_cache.get(cache_key)
+        if cached_id is not None:
+            return cached_id
+
         placeholders = ','.join(['?' for _ in data])
         columns = ','.join(data.keys())
         query = f"INSERT OR IGNORE INTO {table_name} ({columns}) VALUES ({placeholders})"
@@ -117,14 +380,17 @@ class Database:
         # Obtener el ID insertado o existente
         where_clause = ' AND '.join([f"{k}=?" for k in data.keys()])
         cursor.execute(f"SELECT rowid FROM {table_name} WHERE {where_clause}", list(data.values()))
-        return cursor.fetchone()[0]
+        id_dimension = cursor.fetchone()[0]
+        self.key_cache.put(cache_key, id_dimension)
+        return id_dimension
 
+    @etapa_etl('process_dataframe_to_db')
     def process_dataframe_to_db(self, df):
         """
         Procesa un DataFrame y lo inserta en la base de datos.
         """
         self.connect()
-        for _, row in df.iterrows():
+        for numero_fila, (_, row) in enumerate(df.iterrows(), start=1):
             # Insertar en las tablas dimensionales
             
             departamento_data = {
@@ -153,7 +419,7 @@ class Database:
             }
             id_tiempo = self.insert_dimension_data(self.cursor, 'DimensionTemporal', tiempo_data)
 
-            estudiante_data = {'Genero': row['SEXO']}
+            estudiante_data = {'genero': row['SEXO']}
             id_estudiante = self.insert_dimension_data(self.cursor, 'DimensionEstudiantes', estudiante_data)
 
             academica_data = {
@@ -178,31 +444,585 @@ class Database:
             columns = ','.join(hechos_data.keys())
             query = f"INSERT INTO TablaHechosSNIES ({columns}) VALUES ({placeholders})"
             self.cursor.execute(query, list(hechos_data.values()))
+            if numero_fila % self.batch_size == 0:
+                self.connection.commit()
+
+        self.build_rollups()
+
+        # Actualizar las estadísticas que usa el planificador de consultas
+        self.cursor.execute("ANALYZE")
         self.close()
 
+    @etapa_etl('process_dataframe_to_db_bulk')
+    def process_dataframe_to_db_bulk(self, df):
+        """
+        Procesa un DataFrame y lo inserta en la base de datos de forma masiva.
+
+        Produce el mismo modelo dimensional que process_dataframe_to_db, pero
+        deduplica cada dimensión en pandas, asigna las llaves subrogadas en
+        memoria y escribe todo con executemany, confirmando cada batch_size hechos.
+        Las tablas de resumen que lee el tablero se reemplazan en la última
+        transacción, así que el tablero nunca ve un cargue a medias.
+        """
+        self.connect()
+        try:
+            self._insert_bulk(df, commit_batches=True)
+            self.build_rollups()
+            self.cursor.execute("ANALYZE")
+        except Exception:
+            self.connection.rollback()
+            raise
+        finally:
+            self.close()
+
+    @contextmanager
+    def shadow_build(self):
+        """
+        Dirige los cargues hechos dentro del bloque with a una copia de la base
+        y, si terminan sin errores, publica la copia sobre la base original.
+
+        La publicación usa la API de backup de SQLite en una sola transacción,
+        así que los lectores en modo WAL siguen viendo los datos anteriores
+        hasta que la copia completa queda disponible.
+        """
+        original = self.db_name
+        descriptor, sombra = tempfile.mkstemp(
+            prefix='.sombra_', suffix='.db', dir=os.path.dirname(os.path.abspath(original))
+        )
+        os.close(descriptor)
+        try:
+            origen, destino = sqlite3.connect(original, timeout=30), sqlite3.connect(sombra)
+            try:
+                origen.backup(destino)
+            finally:
+                origen.close()
+                destino.close()
+
+            self.db_name = sombra
+            self.key_cache.clear()
+            try:
+                yield self
+            finally:
+                self.db_name = original
+                self.key_cache.clear()
+
+            origen, destino = sqlite3.connect(sombra), sqlite3.connect(original, timeout=30)
+            try:
+                origen.backup(destino)
+            finally:
+                origen.close()
+                destino.close()
+        finally:
+            for ruta in (sombra, f"{sombra}-wal", f"{sombra}-shm"):
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+
+    def export_parquet(self, ruta):
+        """
+        Exporta las tablas del modelo estrella a `ruta`, un Parquet por tabla,
+        para consultarlas con un motor columnar (ver backend.DuckDBBackend).
+        Todas las tablas se leen en una misma transacción y por bloques de
+        batch_size filas; el manifiesto se escribe al final.
+        """
+        if pyarrow is None:
+            raise ImportError("Exportar a Parquet requiere pyarrow")
+        os.makedirs(ruta, exist_ok=True)
+        self.connect()
+        try:
+            self.cursor.execute("BEGIN")
+            filas_por_tabla = {}
+            for table_name in self.STAR_TABLES:
+                self.cursor.execute(f"PRAGMA table_info({table_name})")
+                columnas = [(fila[1], fila[2].upper()) for fila in self.cursor.fetchall()]
+                schema = pyarrow.schema([
+                    (nombre, pyarrow.int64() if tipo == 'INTEGER' else pyarrow.string()) for nombre, tipo in columnas
+                ])
+                destino = os.path.join(ruta, f"{table_name}.parquet")
+                self.cursor.execute(f"SELECT {', '.join(nombre for nombre, _ in columnas)} FROM {table_name}")
+                filas_por_tabla[table_name] = 0
+                with pq.ParquetWriter(destino + '.tmp', schema) as escritor:
+                    while True:
+                        filas = self.cursor.fetchmany(self.batch_size)
+                        if not filas:
+                            break
+                        escritor.write_batch(pyarrow.RecordBatch.from_arrays(
+                            [pyarrow.array(valores, type=campo.type) for valores, campo in zip(zip(*filas), schema)],
+                            schema=schema,
+                        ))
+                        filas_por_tabla[table_name] += len(filas)
+                os.replace(destino + '.tmp', destino)
+        finally:
+            self.close()
+
+        with open(os.path.join(ruta, 'manifiesto.json.tmp'), 'w', encoding='utf-8') as archivo:
+            json.dump({'tablas': filas_por_tabla}, archivo, indent=1)
+        os.replace(os.path.join(ruta, 'manifiesto.json.tmp'), os.path.join(ruta, 'manifiesto.json'))
+        return filas_por_tabla
+
+    def unchanged_files(self, archivos, codigo_institucion=None):
+        """
+        Indica si todos los archivos fuente ya fueron cargados con el mismo contenido
+        y el mismo filtro de instituciones, en cuyo caso no es necesario leerlos ni
+        volver a cargarlos.
+        """
+        filtro = filter_hash(codigo_institucion)
+        self.connect()
+        try:
+            for nombre_archivo in archivos:
+                self.cursor.execute(
+                    "SELECT DISTINCT hashArchivo, hashFiltro FROM ControlCargue WHERE archivo = ?",
+                    (os.path.basename(nombre_archivo),)
+                )
+                if self.cursor.fetchall() != [(file_hash(nombre_archivo), filtro)]:
+                    return False
+            return True
+        finally:
+            self.close()
+
+    @etapa_etl('process_dataframe_to_db_incremental')
+    def process_dataframe_to_db_incremental(self, df, archivos, codigo_institucion=None):
+        """
+        Carga de forma incremental e idempotente un DataFrame unificado construido
+        a partir de `archivos`, filtrados por `codigo_institucion`.
+
+        Los datos se dividen en particiones por año, semestre e institución. Solo
+        se reemplazan las particiones nuevas o cuyo contenido cambió, y se eliminan
+        las que ya no aparecen en los archivos, por ejemplo las de una institución
+        que salió del filtro; todo en una sola transacción. Si ningún archivo ni el
+        filtro cambiaron desde el último cargue no se modifica nada.
+        """
+        hashes = {os.path.basename(nombre): file_hash(nombre) for nombre in archivos}
+        filtro = filter_hash(codigo_institucion)
+
+        self.connect()
+        try:
+            placeholders = ','.join(['?' for _ in hashes])
+            cargadas = pd.read_sql_query(
+                f"SELECT * FROM ControlCargue WHERE archivo IN ({placeholders})",
+                self.connection, params=list(hashes)
+            )
+            hashes_cargados = cargadas.groupby('archivo')['hashArchivo'].agg(set).to_dict()
+            filtros_cargados = set(cargadas['hashFiltro'])
+            if filtros_cargados == {filtro} and all(
+                hashes_cargados.get(nombre) == {valor} for nombre, valor in hashes.items()
+            ):
+                print("Los archivos no cambiaron desde el último cargue.")
+                return
+
+            anteriores = {}
+            for fila in cargadas.itertuples(index=False):
+                anteriores.setdefault((fila.anio, fila.semestre, fila.institucion), set()).add(
+                    (fila.archivo, fila.hashParticion)
+                )
+
+            particiones = {}
+            cambiadas = []
+            for llave, particion in df.groupby(columnas_particion, sort=False, dropna=False, observed=True):
+                llave = tuple(v.item() if hasattr(v, 'item') else v for v in llave)
+                particiones[llave] = _partition_hash(particion)
+                if anteriores.get(llave) != {(nombre, particiones[llave]) for nombre in hashes}:
+                    cambiadas.append(llave)
+            eliminadas = [llave for llave in anteriores if llave not in particiones]
+
+            for anio, semestre, institucion in cambiadas + eliminadas:
+                self.delete_partition(anio, semestre, institucion)
+
+            if cambiadas:
+                indice = pd.MultiIndex.from_frame(df[columnas_particion])
+                self._insert_bulk(df[indice.isin(cambiadas)])
+
+            self.cursor.execute(f"DELETE FROM ControlCargue WHERE archivo IN ({placeholders})", list(hashes))
+            self.cursor.executemany(
+                "INSERT INTO ControlCargue (archivo, anio, semestre, institucion, hashArchivo, hashParticion, hashFiltro) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(nombre, *llave, hashes[nombre], hash_particion, filtro)
+                 for llave, hash_particion in particiones.items() for nombre in hashes]
+            )
+
+            instituciones = sorted({llave[2] for llave in cambiadas + eliminadas})
+            self.build_rollups(instituciones)
+            self.cursor.execute("PRAGMA optimize")
+            print(f"Particiones reemplazadas: {len(cambiadas)}, eliminadas: {len(eliminadas)}.")
+        except Exception:
+            self.connection.rollback()
+            raise
+        finally:
+            self.close()
+
+    def delete_partition(self, anio, semestre, institucion):
+        """Elimina los hechos de una institución en un año y semestre."""
+        self.cursor.execute('''
+        DELETE FROM TablaHechosSNIES
+        WHERE idTiempo IN (SELECT idTiempo FROM DimensionTemporal WHERE anio = ? AND semestre = ?)
+        AND idInstitucion IN (SELECT idInstitucion FROM DimensionInstitucion WHERE nombreInstitucion = ?)
+        ''', (anio, semestre, institucion))
+
+    @etapa_etl('process_files_streaming')
+    def process_files_streaming(self, carga, especificaciones, codigo_institucion=None, tamano_bloque=50000):
+        """
+        Carga los archivos de principio a fin por bloques, para que la memoria
+        usada no dependa del tamaño de los archivos.
+
+        Primero copia las filas de cada archivo a una base SQLite temporal, en
+        bloques de `tamano_bloque` filas. Luego lee, unifica y escribe en el
+        modelo estrella una institución a la vez, confirmando cada una antes de
+        pasar a la siguiente. Los periodos ya cargados de cada institución se
+        reemplazan, así que volver a ejecutarlo no duplica hechos.
+        `especificaciones` es una lista de diccionarios con nombre_archivo, hoja,
+        encabezado y dataset.
+        """
+        directorio = tempfile.mkdtemp(prefix='snies_')
+        staging = sqlite3.connect(os.path.join(directorio, 'staging.db'))
+        try:
+            con_vacios = {}
+            for especificacion in especificaciones:
+                con_vacios[especificacion['dataset']] = carga.staging_archivo(
+                    staging, codigo_institucion=codigo_institucion, tamano_bloque=tamano_bloque, **especificacion
+                )
+
+            consulta = ' UNION '.join(
+                [f'SELECT "INSTITUCIÓN DE EDUCACIÓN SUPERIOR (IES)" FROM staging_{dataset}' for dataset in con_vacios]
+            )
+            instituciones = [fila[0] for fila in staging.execute(consulta)]
+
+            self.connect()
+            try:
+                for institucion in instituciones:
+                    dataframes = {
+                        dataset: carga.leer_staging(staging, dataset, institucion, vacios)
+                        for dataset, vacios in con_vacios.items()
+                    }
+                    df = carga.unificar_dataframes(
+                        dataframes.get('I'), dataframes.get('M'), dataframes.get('A'), dataframes.get('G')
+                    )
+                    del dataframes
+                    for anio, semestre in df[['AÑO', 'SEMESTRE']].drop_duplicates().astype(object).itertuples(index=False):
+                        self.delete_partition(anio, semestre, institucion)
+                    self._insert_bulk(df)
+                    self.connection.commit()
+
+                self.build_rollups()
+                self.cursor.execute("ANALYZE")
+            except Exception:
+                self.connection.rollback()
+                raise
+            finally:
+                self.close()
+        finally:
+            staging.close()
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    def _insert_bulk(self, df, commit_batches=False):
+        """
+        Inserta un DataFrame unificado usando la conexión abierta. Los hechos se
+        escriben en lotes de batch_size filas; solo se confirma cada lote si
+        commit_batches es verdadero.
+        """
+        departamento_data = df[['DEPARTAMENTO DE OFERTA DEL PROGRAMA', 'CÓDIGO DEL DEPARTAMENTO (PROGRAMA)']]
+        departamento_data.columns = ['nombreDepartamento', 'codigoDepartamento']
+        id_departamento = self.bulk_dimension_keys('DimensionDepartamento', 'idDepartamento', departamento_data)
+
+        institucion_data = df[['INSTITUCIÓN DE EDUCACIÓN SUPERIOR (IES)', 'CARÁCTER IES']]
+        institucion_data.columns = ['nombreInstitucion', 'tipoInstitucion']
+        institucion_data = institucion_data.assign(idInstitucionDpto=id_departamento)
+        id_institucion = self.bulk_dimension_keys('DimensionInstitucion', 'idInstitucion', institucion_data)
+
+        municipio_data = df[['MUNICIPIO DE OFERTA DEL PROGRAMA', 'CÓDIGO DEL MUNICIPIO (PROGRAMA)']]
+        municipio_data.columns = ['nombreMunicipio', 'codigoMunicipio']
+        municipio_data = municipio_data.assign(idMunicipioDpto=id_departamento)
+        self.bulk_dimension_keys('DimensionMunicipio', 'idMunicipio', municipio_data)
+
+        tiempo_data = df[['AÑO', 'SEMESTRE']]
+        tiempo_data.columns = ['anio', 'semestre']
+        id_tiempo = self.bulk_dimension_keys('DimensionTemporal', 'idTiempo', tiempo_data)
+
+        estudiante_data = df[['SEXO']]
+        estudiante_data.columns = ['genero']
+        id_estudiante = self.bulk_dimension_keys('DimensionEstudiantes', 'idEstudiante', estudiante_data)
+
+        academica_data = df[['NIVEL ACADÉMICO', 'PROGRAMA ACADÉMICO', 'MODALIDAD']]
+        academica_data.columns = ['nivelEducativo', 'programaAcademico', 'modalidad']
+        id_academico = self.bulk_dimension_keys('DimensionAcademica', 'idAcademico', academica_data)
+
+        # Insertar en la tabla de hechos
+        hechos_data = pd.DataFrame({
+            'idTiempo': id_tiempo,
+            'idEstudiante': id_estudiante,
+            'idAcademico': id_academico,
+            'idInstitucion': id_institucion,
+            'inscritos': df.get('INSCRITOS', 0),
+            'admitidos': df.get('ADMITIDOS', 0),
+            'matriculados': df.get('MATRICULADOS', 0),
+            'graduados': df.get('GRADUADOS', 0)
+        }, index=df.index)
+        placeholders = ','.join(['?' for _ in hechos_data.columns])
+        columns = ','.join(hechos_data.columns)
+        query = f"INSERT INTO TablaHechosSNIES ({columns}) VALUES ({placeholders})"
+        for inicio in range(0, len(hechos_data), self.batch_size):
+            lote = hechos_data.iloc[inicio:inicio + self.batch_size]
+            self.cursor.executemany(query, lote.astype(object).itertuples(index=False, name=None))
+            if commit_batches:
+                self.connection.commit()
+
+    def bulk_dimension_keys(self, table_name, id_column, data):
+        """
+        Asigna llaves subrogadas a todas las filas de `data` en una sola pasada.
+
+        Los miembros únicos que ya existen en la tabla conservan su llave; los
+        nuevos reciben llaves consecutivas y se insertan con executemany.
+        Retorna una Serie de llaves alineada con el índice de `data`.
+        """
+        columnas = list(data.columns)
+        grupos = data.groupby(columnas, sort=False, dropna=False, observed=True).ngroup().to_numpy()
+        miembros = self._normalize_affinity(table_name, data.drop_duplicates()).reset_index(drop=True)
+
+        # Buscar solo los miembros de `data` que ya existen, usando el índice de la llave natural
+        self.cursor.execute("DROP TABLE IF EXISTS temp.miembros_cargue")
+        self.cursor.execute(f"CREATE TEMP TABLE miembros_cargue ({','.join(columnas)})")
+        self.cursor.executemany(
+            f"INSERT INTO temp.miembros_cargue VALUES ({','.join(['?' for _ in columnas])})",
+            miembros.drop_duplicates().itertuples(index=False, name=None)
+        )
+        condicion = ' AND '.join([f"d.{c} IS m.{c}" for c in columnas])
+        existentes = pd.read_sql_query(
+            f"SELECT d.{id_column}, {','.join(['d.' + c for c in columnas])} "
+            f"FROM temp.miembros_cargue m CROSS JOIN {table_name} d ON {condicion}",
+            self.connection
+        ).sort_values(id_column)
+        self.cursor.execute("DROP TABLE temp.miembros_cargue")
+        existentes = self._normalize_affinity(table_name, existentes[columnas]).assign(
+            **{id_column: existentes[id_column]}
+        ).drop_duplicates(subset=columnas)
+
+        unicos = miembros.drop_duplicates().merge(existentes, on=columnas, how='left')
+        nuevos = unicos[id_column].isna()
+        self.cursor.execute(f"SELECT MAX({id_column}) FROM {table_name}")
+        siguiente = (self.cursor.fetchone()[0] or 0) + 1
+        unicos.loc[nuevos, id_column] = range(siguiente, siguiente + int(nuevos.sum()))
+        unicos[id_column] = unicos[id_column].astype('int64')
+
+        if nuevos.any():
+            insertar = unicos.loc[nuevos, [id_column] + columnas]
+            placeholders = ','.join(['?' for _ in insertar.columns])
+            query = f"INSERT INTO {table_name} ({','.join(insertar.columns)}) VALUES ({placeholders})"
+            self.cursor.executemany(query, insertar.astype(object).itertuples(index=False, name=None))
+
+        # Los grupos se numeran en orden de aparición, igual que drop_duplicates
+        llaves = miembros.merge(unicos, on=columnas, how='left')[id_column].to_numpy()
+        return pd.Series(llaves[grupos], index=data.index)
+
+    def _normalize_affinity(self, table_name, data):
+        """
+        Convierte los valores al tipo que SQLite almacenaría según la afinidad de
+        cada columna, para que las llaves naturales se comparen igual que en SQL.
+        """
+        self.cursor.execute(f"PRAGMA table_info({table_name})")
+        tipos = {fila[1].lower(): fila[2].upper() for fila in self.cursor.fetchall()}
+        data = data.astype(object)
+        for columna in data.columns:
+            presentes = data[columna].notna()
+            if tipos.get(columna.lower()) == 'TEXT':
+                data.loc[presentes, columna] = data.loc[presentes, columna].map(str)
+            elif tipos.get(columna.lower()) == 'INTEGER':
+                data.loc[presentes, columna] = data.loc[presentes, columna].map(_integer_affinity)
+            data.loc[~presentes, columna] = None
+        return data
+
 class Cargue:
+    # Columnas necesarias según el dataset
+    COLUMNAS_DATASET = {
+        'A': columnas_requeridas_A,
+        'M': columnas_requeridas_M,
+        'G': columnas_requeridas_G,
+        'I': columnas_requeridas_I,
+    }
+
+    # Versión del formato de los archivos en caché; cambia cuando cambian los tipos de las columnas
+    CACHE_VERSION = 2
+
+    def __init__(self, cache_dir='.cache_snies'):
+        # Directorio donde se guardan los libros ya procesados en formato Parquet
+        self.cache_dir = cache_dir
+
+    @etapa_etl('cargue_archivo')
     def cargue_archivo(self, nombre_archivo, hoja, encabezado, codigo_institucion, dataset):
-        df = pd.read_excel(nombre_archivo, sheet_name=hoja, header=encabezado, dtype={'CÓDIGO DEL DEPARTAMENTO (PROGRAMA)': str})
-
-        # Definir las columnas necesarias según el dataset
-        if dataset == 'A':
-            df = df[columnas_requeridas_A]
-        elif dataset == 'M':
-            df = df[columnas_requeridas_M]
-        elif dataset == 'G':
-            df = df[columnas_requeridas_G]
-        elif dataset == 'I':
-            df = df[columnas_requeridas_I]
-
-        # Filtrar por código de institución
-        # df = df[df['CÓDIGO DE LA INSTITUCIÓN'] == codigo_institucion]
-        df = df[df["INSTITUCIÓN DE EDUCACIÓN SUPERIOR (IES)"].isin(codigo_institucion)]
-        
+        """
+        Lee las columnas requeridas del dataset y las filas de las instituciones
+        indicadas (todas si codigo_institucion es None).
+
+        El resultado se guarda en Parquet con una llave basada en el hash del
+        archivo, de modo que los cargues repetidos no vuelven a leer el XLSX.
+        """
+        columnas = self.COLUMNAS_DATASET[dataset]
+        ruta_cache = self._cache_path(nombre_archivo, hoja, encabezado, codigo_institucion, dataset)
+        if ruta_cache and os.path.exists(ruta_cache):
+            # Parquet no conserva las categorías enteras (AÑO, SEMESTRE); se vuelven a compactar
+            return self.tipos_compactos(pd.read_parquet(ruta_cache))
+
+        df = self.leer_excel(nombre_archivo, hoja, encabezado, columnas, codigo_institucion)
+
+        if ruta_cache:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            df.to_parquet(ruta_cache, index=False)
+        return df
+
+    @etapa_etl('cargue_paralelo')
+    def cargue_paralelo(self, especificaciones, max_workers=None):
+        """
+        Ejecuta cargue_archivo sobre varios archivos a la vez, cada uno en su propio proceso.
+        `especificaciones` es una lista de diccionarios con los argumentos de
+        cargue_archivo; retorna los DataFrames en el mismo orden.
+        """
+        max_workers = max_workers or min(len(especificaciones), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futuros = [executor.submit(self.cargue_archivo, **especificacion) for especificacion in especificaciones]
+            return [futuro.result() for futuro in futuros]
+
+    def leer_excel(self, nombre_archivo, hoja, encabezado, columnas, codigo_institucion):
+        """
+        Lee una hoja de Excel fila por fila, conservando solo `columnas` y las
+        filas de las instituciones indicadas, sin cargar la hoja completa en memoria.
+        Los tipos resultantes coinciden con los de pd.read_excel sobre la hoja completa.
+        """
+        con_vacios = [False] * len(columnas)
+        filas = self.filas_excel(nombre_archivo, hoja, encabezado, columnas, codigo_institucion, con_vacios)
+        df = pd.DataFrame(list(filas), columns=columnas)
+        return self.tipos_excel(df, con_vacios)
+
+    def filas_excel(self, nombre_archivo, hoja, encabezado, columnas, codigo_institucion, con_vacios):
+        """
+        Genera, una a una, las filas de la hoja con los valores de `columnas`
+        para las instituciones indicadas (todas si codigo_institucion es None).
+
+        Marca en `con_vacios` las columnas que tienen celdas vacías en cualquier
+        fila de la hoja, incluidas las de otras instituciones, porque pd.read_excel
+        las leería como float.
+        """
+        libro = openpyxl.load_workbook(nombre_archivo, read_only=True, data_only=True)
+        try:
+            hoja_excel = libro.worksheets[hoja] if isinstance(hoja, int) else libro[hoja]
+            filas = hoja_excel.iter_rows(min_row=encabezado + 1, values_only=True)
+            nombres = list(next(filas))
+            posiciones = [nombres.index(columna) for columna in columnas]
+            posicion_ies = nombres.index("INSTITUCIÓN DE EDUCACIÓN SUPERIOR (IES)")
+            instituciones = None if codigo_institucion is None else set(codigo_institucion)
+
+            for fila in filas:
+                valores = [fila[p] if p < len(fila) else None for p in posiciones]
+                if all(valor is None for valor in valores):
+                    continue
+                for i, valor in enumerate(valores):
+                    if valor is None:
+                        con_vacios[i] = True
+                ies = fila[posicion_ies] if posicion_ies < len(fila) else None
+                if instituciones is None or ies in instituciones:
+                    yield valores
+        finally:
+            libro.close()
+
+    def tipos_excel(self, df, con_vacios):
+        """Aplica a las filas leídas los tipos que pd.read_excel daría a la hoja completa."""
+        for columna, vacios in zip(df.columns, con_vacios):
+            if columna == 'CÓDIGO DEL DEPARTAMENTO (PROGRAMA)':
+                df[columna] = df[columna].map(_excel_text, na_action='ignore').astype(object)
+            elif vacios and pd.api.types.is_integer_dtype(df[columna]):
+                df[columna] = df[columna].astype(float)
+        return self.tipos_compactos(df)
+
+    def staging_archivo(self, staging, nombre_archivo, hoja, encabezado, dataset,
+                        codigo_institucion=None, tamano_bloque=50000):
+        """
+        Copia las filas requeridas de un archivo a la tabla staging_<dataset> de
+        la conexión `staging`, en bloques de `tamano_bloque` filas, de modo que
+        nunca hay más de un bloque en memoria.
+        Retorna las columnas con celdas vacías, que necesita leer_staging.
+        """
+        columnas = self.COLUMNAS_DATASET[dataset]
+        tabla = f"staging_{dataset}"
+        staging.execute(f"DROP TABLE IF EXISTS {tabla}")
+        nombres = ','.join(['"' + columna + '"' for columna in columnas])
+        staging.execute(f"CREATE TABLE {tabla} ({nombres})")
+        query = f"INSERT INTO {tabla} VALUES ({','.join(['?' for _ in columnas])})"
+
+        con_vacios = [False] * len(columnas)
+        filas = self.filas_excel(nombre_archivo, hoja, encabezado, columnas, codigo_institucion, con_vacios)
+        while True:
+            bloque = list(itertools.islice(filas, tamano_bloque))
+            if not bloque:
+                break
+            staging.executemany(query, bloque)
+            staging.commit()
+
+        staging.execute(f'CREATE INDEX idx_{tabla} ON {tabla} ("INSTITUCIÓN DE EDUCACIÓN SUPERIOR (IES)")')
+        staging.commit()
+        return con_vacios
+
+    def leer_staging(self, staging, dataset, institucion, con_vacios):
+        """Lee de la tabla staging_<dataset> las filas de una institución, con los tipos de leer_excel."""
+        df = pd.read_sql_query(
+            f'SELECT * FROM staging_{dataset} WHERE "INSTITUCIÓN DE EDUCACIÓN SUPERIOR (IES)" = ?',
+            staging, params=(institucion,)
+        )
+        return self.tipos_excel(df, con_vacios)
+
+    def tipos_compactos(self, df):
+        """
+        Convierte las columnas de baja cardinalidad a categóricas y reduce las
+        métricas al tipo entero más pequeño que las contiene.
+        """
+        for columna in df.columns:
+            if columna in columnas_categoricas:
+                df[columna] = df[columna].astype('category')
+            elif columna in columnas_metricas:
+                df[columna] = pd.to_numeric(df[columna], downcast='integer')
         return df
+
+    def compartir_categorias(self, dataframes):
+        """
+        Asigna a cada columna categórica las mismas categorías en todos los
+        DataFrames, para que los merge comparen códigos enteros en vez de textos.
+        """
+        for columna in columnas_categoricas:
+            con_columna = [df for df in dataframes if columna in df.columns]
+            series = [df[columna] for df in con_columna]
+            if not series or not all(isinstance(serie.dtype, pd.CategoricalDtype) for serie in series):
+                continue
+            if len({serie.cat.categories.dtype for serie in series}) > 1:
+                series = self.categorias_compatibles(series)
+            dtype = pd.CategoricalDtype(union_categoricals(series, ignore_order=True).categories)
+            for df, serie in zip(con_columna, series):
+                df[columna] = serie.astype(dtype)
+
+    def categorias_compatibles(self, series):
+        """
+        Lleva a un mismo tipo las categorías de series de distintos archivos. Una
+        celda vacía hace que pandas lea AÑO o SEMESTRE como float en un archivo y
+        como entero en los demás; las categorías float con valores enteros se
+        vuelven enteras, y si aun así difieren, todas pasan a texto.
+        """
+        convertidas = []
+        for serie in series:
+            categorias = serie.cat.categories
+            if categorias.dtype.kind == 'f' and np.all(np.mod(categorias.to_numpy(), 1) == 0):
+                serie = serie.cat.rename_categories(categorias.astype(np.int64))
+            convertidas.append(serie)
+        if len({serie.cat.categories.dtype for serie in convertidas}) > 1:
+            convertidas = [serie.astype(object).astype('category') for serie in convertidas]
+        return convertidas
+
+    def _cache_path(self, nombre_archivo, hoja, encabezado, codigo_institucion, dataset):
+        """Ruta del Parquet en caché para una lectura, o None si no se puede usar el caché."""
+        if self.cache_dir is None or pyarrow is None:
+            return None
+        instituciones = None if codigo_institucion is None else sorted(codigo_institucion)
+        llave = repr((self.CACHE_VERSION, file_hash(nombre_archivo), hoja, encabezado, dataset, instituciones))
+        return os.path.join(self.cache_dir, hashlib.sha256(llave.encode()).hexdigest() + '.parquet')
     
+    @etapa_etl('unificar_dataframes')
     def unificar_dataframes(self, df_inscritos, df_matriculados, df_admitidos, df_graduados):
         """
         Unifica los DataFrames usando las columnas comunes y mantiene las métricas específicas de cada uno.
+        Los datasets se apilan y se agregan en una sola pasada, en lugar de encadenar merge externos.
         """
         columnas_merge = [
             'CÓDIGO DE LA INSTITUCIÓN',
@@ -220,18 +1040,39 @@ class Cargue:
             'SEMESTRE'
         ]
 
-        df_final = df_inscritos[columnas_merge + ['INSCRITOS']].copy()
-        if df_matriculados is not None:
-            df_final = df_final.merge(df_matriculados[columnas_merge + ['MATRICULADOS']], on=columnas_merge, how='outer')
-        if df_admitidos is not None:
-            df_final = df_final.merge(df_admitidos[columnas_merge + ['ADMITIDOS']], on=columnas_merge, how='outer')
-        if df_graduados is not None:
-            df_final = df_final.merge(df_graduados[columnas_merge + ['GRADUADOS']], on=columnas_merge, how='outer')
-
+        # Apilar los cuatro datasets con una etiqueta de métrica y agregarlos en una
+        # sola pasada, usando el número de grupo de las llaves para ubicar cada valor
         metricas = ['INSCRITOS', 'MATRICULADOS', 'ADMITIDOS', 'GRADUADOS']
-        df_final[metricas] = df_final[metricas].fillna(0)
+        partes = []
+        etiquetas = []
+        for i, (df, metrica) in enumerate(zip((df_inscritos, df_matriculados, df_admitidos, df_graduados), metricas)):
+            if df is None:
+                continue
+            partes.append(df[columnas_merge + [metrica]].rename(columns={metrica: 'VALOR'}))
+            etiquetas.append(np.full(len(df), i, dtype=np.int8))
+        self.compartir_categorias(partes)
+        combinado = pd.concat(partes, ignore_index=True)
+        etiquetas = np.concatenate(etiquetas)
+        del partes
+
+        # Número de grupo de cada fila, combinando las llaves columna por columna para
+        # no materializar a la vez los códigos de las 13 columnas
+        grupos = np.zeros(len(combinado), dtype=np.int64)
+        for columna in columnas_merge:
+            codigos, categorias = pd.factorize(combinado[columna], use_na_sentinel=False)
+            grupos, _ = pd.factorize(grupos * len(categorias) + codigos)
+        _, primeras_filas = np.unique(grupos, return_index=True)
+        df_final = combinado.loc[primeras_filas, columnas_merge].reset_index(drop=True)
+        valores = combinado['VALOR'].to_numpy(dtype=np.float64, na_value=0)
+        del combinado
+
+        for i, metrica in enumerate(metricas):
+            es_metrica = etiquetas == i
+            df_final[metrica] = np.bincount(
+                grupos[es_metrica], weights=valores[es_metrica], minlength=len(df_final)
+            ).astype(np.int64)
 
-        return df_final
+        return self.tipos_compactos(df_final)
 
 # Hecho por:
 # Óscar Julian Ramirez Contreras
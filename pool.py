@@ -0,0 +1,110 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+class ConnectionPool:
+    """
+    Pool de conexiones de solo lectura a una base SQLite, seguro entre hilos.
+
+    Las conexiones se abren con mode=ro y con pragmas ajustados para consultas,
+    y se reutilizan entre callbacks. Cada proceso (por ejemplo, cada worker de
+    gunicorn) tiene sus propias conexiones, y se vuelven a abrir si el archivo
+    de la base es reemplazado. El pool nunca escribe en la base: si no existe,
+    abrir una conexión falla, y el modo WAL lo activa el cargue (Database.connect).
+    """
+    PRAGMAS = {
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,
+        'temp_store': 'MEMORY',
+        'query_only': 1,
+    }
+
+    def __init__(self, db_name, size=8, timeout=30):
+        self.db_name = db_name
+        self.size = size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._reset()
+
+    @contextmanager
+    def connection(self):
+        """Presta una conexión del pool durante el bloque with."""
+        conn, generation = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn, generation)
+
+    def acquire(self):
+        """Toma una conexión libre, o abre una nueva si el pool no está lleno."""
+        self._check_process_and_file()
+        generation = self._generation
+        try:
+            return self._idle.get_nowait(), generation
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return self._open(), generation
+                except Exception:
+                    self._opened -= 1
+                    raise
+        return self._idle.get(timeout=self.timeout), generation
+
+    def release(self, conn, generation):
+        """Devuelve una conexión al pool; las de una generación anterior se cierran."""
+        if generation != self._generation or os.getpid() != self._pid:
+            conn.close()
+            return
+        self._idle.put(conn)
+
+    def close_all(self):
+        """Cierra las conexiones libres del pool."""
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._opened = 0
+
+    def _open(self):
+        uri = f"file:{pathname2url(os.path.abspath(self.db_name))}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, timeout=self.timeout)
+        for pragma, valor in self.PRAGMAS.items():
+            conn.execute(f"PRAGMA {pragma}={valor}")
+        return conn
+
+    def _reset(self):
+        self._idle = queue.Queue()
+        self._opened = 0
+        self._pid = os.getpid()
+        self._inode = self._file_inode()
+        self._generation = getattr(self, '_generation', 0) + 1
+
+    def _file_inode(self):
+        try:
+            return os.stat(self.db_name).st_ino
+        except FileNotFoundError:
+            return None
+
+    def _check_process_and_file(self):
+        # Las conexiones heredadas de otro proceso, o de un archivo ya reemplazado, no se reutilizan
+        if os.getpid() == self._pid and self._file_inode() == self._inode:
+            return
+        with self._lock:
+            if os.getpid() != self._pid:
+                self._reset()
+            elif self._file_inode() != self._inode:
+                viejas = self._idle
+                self._reset()
+                while True:
+                    try:
+                        viejas.get_nowait().close()
+                    except queue.Empty:
+                        break
@@ -1,11 +1,18 @@
+import os
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+import metricas
+from backend import BACKEND, PARQUET_DIR
 from model import Database, Cargue
 
-# Crear instancia de la base de datos y las tablas
-db = Database('snies.db')
-db.create_tables()
+@contextmanager
+def etapa(nombre):
+    """Mide e imprime el tiempo de una etapa del cargue."""
+    inicio = time.perf_counter()
+    yield
+    print(f"{nombre}: {time.perf_counter() - inicio:.2f} s")
 
-# Cargar los datos
-carga = Cargue()
 # institucion = 2712
 institucion = ["FUNDACION UNIVERSITARIA KONRAD LORENZ",
                  "UNIVERSIDAD NACIONAL DE COLOMBIA", 
@@ -13,18 +20,59 @@ institucion = ["FUNDACION UNIVERSITARIA KONRAD LORENZ",
                 "UNIVERSIDAD ANTONIO NARIÑO",
                 "UNIVERSIDAD EXTERNADO DE COLOMBIA"]
 
-# Cargar los DataFrames individuales
-df_admitidos = carga.cargue_archivo(nombre_archivo='ADM-2023.xlsx', hoja=1, encabezado=5, 
-                                    codigo_institucion=institucion, dataset='A')
-df_matriculados = carga.cargue_archivo(nombre_archivo='MAT-2023.xlsx', hoja=1, encabezado=5, 
-                                       codigo_institucion=institucion, dataset='M')
-df_graduados = carga.cargue_archivo(nombre_archivo='GRA-2023.xlsx', hoja=1, encabezado=5, 
-                                    codigo_institucion=institucion, dataset='G')
-df_inscritos = carga.cargue_archivo(nombre_archivo='INS-2023.xlsx', hoja=1, encabezado=5, 
-                                    codigo_institucion=institucion, dataset='I')
-
-# Unificar los DataFrames
-df_unificado = carga.unificar_dataframes(df_inscritos, df_matriculados, df_admitidos, df_graduados)
-
-# Procesar el DataFrame unificado para la base de datos
-db.process_dataframe_to_db(df_unificado)
+archivos = ['ADM-2023.xlsx', 'MAT-2023.xlsx', 'GRA-2023.xlsx', 'INS-2023.xlsx']
+
+especificaciones = [
+    dict(nombre_archivo='ADM-2023.xlsx', hoja=1, encabezado=5, dataset='A'),
+    dict(nombre_archivo='MAT-2023.xlsx', hoja=1, encabezado=5, dataset='M'),
+    dict(nombre_archivo='GRA-2023.xlsx', hoja=1, encabezado=5, dataset='G'),
+    dict(nombre_archivo='INS-2023.xlsx', hoja=1, encabezado=5, dataset='I'),
+]
+
+# El cargue se ejecuta solo desde el proceso principal; los procesos que leen
+# los archivos en paralelo importan este módulo sin volver a ejecutarlo.
+if __name__ == '__main__':
+    # Crear instancia de la base de datos y las tablas
+    db = Database('snies.db')
+    db.create_tables()
+
+    # Con --migrar las tablas de resumen se reconstruyen completas, por ejemplo
+    # después de cambiar sus consultas en queries.py
+    if '--migrar' in sys.argv:
+        with etapa("Migración de las tablas de resumen"):
+            db.migrate_rollups()
+
+    # Cargar los datos
+    carga = Cargue()
+
+    # Con --sombra el cargue se construye en una copia de la base y se publica al terminar
+    with db.shadow_build() if '--sombra' in sys.argv else nullcontext():
+        if '--por-bloques' in sys.argv:
+            # Cargue por bloques con memoria acotada, para archivos de escala nacional
+            with etapa("Cargue por bloques"):
+                db.process_files_streaming(carga, especificaciones, codigo_institucion=institucion)
+        elif db.unchanged_files(archivos, institucion):
+            print("Los archivos no cambiaron desde el último cargue.")
+        else:
+            # Cargar los DataFrames individuales, un proceso por archivo
+            with etapa("Lectura de archivos"):
+                df_admitidos, df_matriculados, df_graduados, df_inscritos = carga.cargue_paralelo(
+                    [dict(especificacion, codigo_institucion=institucion) for especificacion in especificaciones]
+                )
+
+            # Unificar los DataFrames
+            with etapa("Unificación"):
+                df_unificado = carga.unificar_dataframes(df_inscritos, df_matriculados, df_admitidos, df_graduados)
+
+            # Procesar el DataFrame unificado para la base de datos, reemplazando solo
+            # las particiones (año, semestre, institución) que cambiaron
+            with etapa("Cargue a la base de datos"):
+                db.process_dataframe_to_db_incremental(df_unificado, archivos, institucion)
+
+    # Con el backend duckdb el tablero lee una exportación en Parquet del modelo estrella
+    if BACKEND == 'duckdb':
+        with etapa("Exportación a Parquet"):
+            db.export_parquet(PARQUET_DIR)
+
+    # Con SNIES_METRICAS_ARCHIVO las métricas del cargue se guardan en formato Prometheus
+    metricas.volcar(os.environ.get('SNIES_METRICAS_ARCHIVO'))
@@ -0,0 +1,146 @@
+# Tablas de resumen que se materializan después de cada cargue, una por cada
+# granularidad que usa el tablero: tabla -> (consulta sobre el modelo estrella, columnas del índice)
+ROLLUPS = {
+    'ResumenProgramaGenero': ("""
+    SELECT
+        i.nombreInstitucion as institucion,
+        a.nivelEducativo AS nivel_academico,
+        a.programaAcademico AS nombre_programa,
+        e.genero AS sexo,
+        SUM(h.inscritos) AS inscritos,
+        SUM(h.matriculados) AS matriculados,
+        SUM(h.admitidos) AS admitidos,
+        SUM(h.graduados) AS graduados
+    FROM TablaHechosSNIES h
+    JOIN DimensionInstitucion i ON h.idInstitucion = i.idInstitucion
+    JOIN DimensionAcademica a ON h.idAcademico = a.idAcademico
+    JOIN DimensionEstudiantes e ON h.idEstudiante = e.idEstudiante
+    GROUP BY i.nombreInstitucion, a.nivelEducativo, a.programaAcademico, e.genero
+    """, ['institucion', 'nivel_academico', 'nombre_programa', 'sexo']),
+
+    'ResumenNivelModalidad': ("""
+    SELECT
+        i.nombreInstitucion as institucion,
+        a.nivelEducativo AS nivel_academico,
+        a.modalidad,
+        SUM(h.inscritos) AS inscritos,
+        SUM(h.matriculados) AS matriculados,
+        SUM(h.admitidos) AS admitidos,
+        SUM(h.graduados) AS graduados
+    FROM TablaHechosSNIES h
+    JOIN DimensionInstitucion i ON h.idInstitucion = i.idInstitucion
+    JOIN DimensionAcademica a ON h.idAcademico = a.idAcademico
+    GROUP BY i.nombreInstitucion, a.nivelEducativo, a.modalidad
+    """, ['institucion', 'nivel_academico', 'modalidad']),
+
+    'ResumenNivelGenero': ("""
+    SELECT
+        i.nombreInstitucion as institucion,
+        a.nivelEducativo AS nivel_academico,
+        e.genero AS sexo,
+        SUM(h.inscritos) AS inscritos,
+        SUM(h.matriculados) AS matriculados,
+        SUM(h.admitidos) AS admitidos,
+        SUM(h.graduados) AS graduados
+    FROM TablaHechosSNIES h
+    JOIN DimensionInstitucion i ON h.idInstitucion = i.idInstitucion
+    JOIN DimensionAcademica a ON h.idAcademico = a.idAcademico
+    JOIN DimensionEstudiantes e ON h.idEstudiante = e.idEstudiante
+    GROUP BY i.nombreInstitucion, a.nivelEducativo, e.genero
+    """, ['institucion', 'nivel_academico', 'sexo']),
+
+    'ResumenDepartamento': ("""
+    SELECT
+        i.nombreInstitucion as institucion,
+        d.codigoDepartamento AS codigo_departamento,
+        d.nombreDepartamento AS nombre_departamento,
+        SUM(h.inscritos) AS inscritos,
+        SUM(h.matriculados) AS matriculados,
+        SUM(h.admitidos) AS admitidos,
+        SUM(h.graduados) AS graduados
+    FROM TablaHechosSNIES h
+    JOIN DimensionInstitucion i ON h.idInstitucion = i.idInstitucion
+    JOIN DimensionDepartamento d ON i.idInstitucionDpto = d.idDepartamento
+    GROUP BY i.nombreInstitucion, d.codigoDepartamento, d.nombreDepartamento
+    """, ['institucion', 'codigo_departamento', 'nombre_departamento']),
+}
+
+cantidadesPrograma = """
+    SELECT
+        institucion,
+        nombre_programa,
+        sexo,
+        inscritos,
+        matriculados,
+        admitidos,
+        graduados
+    FROM ResumenProgramaGenero
+    WHERE institucion = ? AND nivel_academico = 'Pregrado'
+    ORDER BY nombre_programa, sexo;
+"""
+
+query2 = """
+SELECT
+    institucion,
+    nivel_academico,
+    modalidad,
+    inscritos,
+    matriculados,
+    admitidos,
+    graduados
+FROM ResumenNivelModalidad
+ORDER BY institucion, nivel_academico, modalidad;
+"""
+
+query4 = """
+SELECT
+    institucion,
+    nivel_academico,
+    sexo,
+    inscritos,
+    matriculados,
+    admitidos,
+    graduados
+FROM ResumenNivelGenero
+WHERE institucion = ?
+ORDER BY nivel_academico, sexo;
+"""
+
+query_map = """
+SELECT
+    institucion,
+    codigo_departamento,
+    nombre_departamento,
+    inscritos,
+    matriculados,
+    admitidos,
+    graduados
+FROM ResumenDepartamento
+WHERE institucion = ?
+ORDER BY codigo_departamento, nombre_departamento;
+"""
+
+# Instituciones con datos en el tablero. Se leen de un resumen y no de DimensionInstitucion,
+# que conserva las instituciones cuyos hechos se eliminaron; ResumenNivelModalidad no
+# depende de la dimensión de departamentos ni de la de estudiantes
+instituciones = """
+SELECT DISTINCT institucion
+FROM ResumenNivelModalidad
+WHERE institucion IS NOT NULL
+ORDER BY institucion;
+"""
+
+# Versión de los datos publicados por el último cargue (ver Database.publish_version)
+version_datos = "SELECT version FROM VersionDatos WHERE id = 1"
+
+# Consultas que usa el tablero, por nombre
+DASHBOARD_QUERIES = {
+    'instituciones': instituciones,
+    'cantidadesPrograma': cantidadesPrograma,
+    'query2': query2,
+    'query4': query4,
+    'query_map': query_map,
+}
+
+# Consultas que leen la tabla de hechos, por nombre
+FACT_QUERIES = {nombre: consulta for nombre, (consulta, _) in ROLLUPS.items()}
@@ -0,0 +1,46 @@
+import re
+import sqlite3
+import sys
+from queries import DASHBOARD_QUERIES, FACT_QUERIES
+
+def fact_table_scans(connection, query):
+    """
+    Ejecuta EXPLAIN QUERY PLAN sobre una consulta y retorna los pasos que
+    recorren completa la tabla de hechos sin usar un índice.
+    """
+    aliases = {'TablaHechosSNIES'}
+    aliases.update(re.findall(r'TablaHechosSNIES\s+(?:AS\s+)?(\w+)', query, flags=re.IGNORECASE))
+    parametros = [None] * query.count('?')
+    plan = connection.execute(f"EXPLAIN QUERY PLAN {query}", parametros).fetchall()
+
+    scans = []
+    for fila in plan:
+        detalle = fila[-1]
+        match = re.match(r'SCAN (\w+)', detalle)
+        if match and match.group(1) in aliases and 'INDEX' not in detalle:
+            scans.append(detalle)
+    return scans
+
+def check_query_plans(db_name='snies.db', queries={**FACT_QUERIES, **DASHBOARD_QUERIES}):
+    """
+    Verifica que ninguna consulta del tablero, ni las que construyen sus tablas
+    de resumen, haga un recorrido completo de la tabla de hechos. Lanza RuntimeError con las consultas que lo hacen.
+    """
+    connection = sqlite3.connect(db_name)
+    try:
+        fallos = {nombre: fact_table_scans(connection, query) for nombre, query in queries.items()}
+    finally:
+        connection.close()
+
+    fallos = {nombre: scans for nombre, scans in fallos.items() if scans}
+    if fallos:
+        detalle = '; '.join(f"{nombre}: {', '.join(scans)}" for nombre, scans in fallos.items())
+        raise RuntimeError(f"Consultas con recorrido completo de TablaHechosSNIES: {detalle}")
+
+if __name__ == '__main__':
+    try:
+        check_query_plans(sys.argv[1] if len(sys.argv) > 1 else 'snies.db')
+    except RuntimeError as error:
+        print(error)
+        sys.exit(1)
+    print("Todas las consultas del tablero usan índices sobre TablaHechosSNIES.")
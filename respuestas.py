@@ -0,0 +1,88 @@
+import gzip
+import hashlib
+import os
+from flask import Response, g, request
+try:
+    from flask_compress import Compress
+except ImportError:
+    Compress = None
+import metricas
+from cache import LRUCache
+
+# Con SNIES_COMPRESION=0 las respuestas se envían sin comprimir
+COMPRESION = os.environ.get('SNIES_COMPRESION', '1') != '0'
+# Respuestas de callbacks guardadas en memoria; con SNIES_CACHE_RESPUESTAS=0 no se guardan
+CACHE_RESPUESTAS = int(os.environ.get('SNIES_CACHE_RESPUESTAS', '128'))
+
+# Compresión de respaldo con gzip, si flask_compress no está instalado
+NIVEL_GZIP = 6
+TAMANO_MINIMO = 500
+TIPOS_COMPRIMIBLES = {'application/json', 'application/javascript', 'text/html', 'text/css', 'text/plain'}
+
+def comprimir(server):
+    """
+    Comprime las respuestas del servidor Flask según el Accept-Encoding del
+    navegador: con flask_compress (brotli o gzip) si está instalado y, si no,
+    con gzip. Las figuras de Plotly y las filas de la tabla se reducen varias veces.
+    """
+    if not COMPRESION:
+        return
+    if Compress is not None:
+        server.config.setdefault('COMPRESS_ALGORITHM', ['br', 'gzip'])
+        Compress(server)
+        return
+
+    @server.after_request
+    def gzip_respuesta(response):
+        response.vary.add('Accept-Encoding')
+        if ('gzip' not in request.accept_encodings or response.status_code != 200
+                or response.direct_passthrough or response.mimetype not in TIPOS_COMPRIMIBLES
+                or 'Content-Encoding' in response.headers):
+            return response
+        datos = response.get_data()
+        if len(datos) < TAMANO_MINIMO:
+            return response
+        response.set_data(gzip.compress(datos, compresslevel=NIVEL_GZIP))
+        response.headers['Content-Encoding'] = 'gzip'
+        # La ETag identifica el contenido sin comprimir; se marca como en flask_compress
+        etag, debil = response.get_etag()
+        if etag and not debil:
+            response.set_etag(f"{etag}:gzip")
+        return response
+
+def cache_callbacks(server, version, ruta='/_dash-update-component', maxsize=CACHE_RESPUESTAS):
+    """
+    Caché en el servidor de las respuestas de los callbacks de Dash, con llave
+    (versión de los datos, cuerpo de la petición).
+
+    Con los mismos datos, las mismas entradas producen la misma salida, así que
+    una petición repetida se responde desde memoria sin ejecutar el callback ni
+    serializar la figura otra vez. La llave incluye `version()`, de modo que un
+    cargue nuevo invalida las respuestas. Debe registrarse después de comprimir,
+    para que se guarde el contenido sin comprimir.
+    """
+    if maxsize <= 0:
+        return
+    respuestas = LRUCache(maxsize)
+
+    @server.before_request
+    def respuesta_guardada():
+        if request.method != 'POST' or request.path != ruta:
+            return None
+        llave = hashlib.sha256(version().encode('utf-8') + b'\0' + request.get_data(cache=True)).hexdigest()
+        guardada = respuestas.get(llave)
+        if guardada is None:
+            metricas.contar('snies_respuesta_cache_total', resultado='fallo')
+            g.llave_respuesta = llave
+            return None
+        metricas.contar('snies_respuesta_cache_total', resultado='acierto')
+        cuerpo, tipo = guardada
+        return Response(cuerpo, content_type=tipo)
+
+    @server.after_request
+    def guardar_respuesta(response):
+        llave = g.pop('llave_respuesta', None)
+        # Solo se guardan las respuestas completas; 204 es un callback sin cambios (PreventUpdate)
+        if llave is not None and response.status_code == 200 and not response.direct_passthrough:
+            respuestas.put(llave, (response.get_data(), response.content_type))
+        return response
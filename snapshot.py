@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import sys
+import pandas as pd
+try:
+    import pyarrow
+    import pyarrow.parquet as pq
+except ImportError:
+    pyarrow = None
+from backend import crear_backend
+from datos import CapaDatos, DatosTablero
+
+# Agregados del tablero; todos traen la columna institucion
+AGREGADOS = ['programas', 'nivel_modalidad', 'nivel_genero', 'departamentos']
+# Agregados que no dependen de la institución seleccionada y se guardan una sola vez
+AGREGADOS_GLOBALES = {'nivel_modalidad'}
+MANIFIESTO = 'manifiesto.json'
+
+def exportar_snapshot(db_name='snies.db', ruta='snapshot'):
+    """
+    Precalcula los agregados del tablero para todas las instituciones de la base
+    y los guarda en `ruta`, un Parquet por agregado y un manifiesto con la
+    versión. Los agregados traen las cuatro métricas, así que cubren todos los
+    estados del tablero sin tener que recorrerlos.
+    """
+    if pyarrow is None:
+        raise ImportError("Exportar el snapshot requiere pyarrow")
+    os.makedirs(ruta, exist_ok=True)
+    backend = crear_backend(db_name)
+    datos = DatosTablero(backend)
+    instituciones = datos.instituciones()
+    version = backend.version()
+
+    partes = {agregado: [] for agregado in AGREGADOS}
+    for institucion in instituciones:
+        agregados = datos.obtener(datos.clave(institucion))
+        for agregado in AGREGADOS:
+            if agregado not in AGREGADOS_GLOBALES or not partes[agregado]:
+                partes[agregado].append(agregados[agregado])
+    backend.close()
+
+    firma = hashlib.sha256()
+    for agregado in AGREGADOS:
+        df = pd.concat(partes[agregado], ignore_index=True) if partes[agregado] else pd.DataFrame()
+        destino = os.path.join(ruta, f"{agregado}.parquet")
+        df.to_parquet(destino + '.tmp', index=False)
+        os.replace(destino + '.tmp', destino)
+        firma.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+
+    # El manifiesto se escribe al final: un snapshot sin manifiesto está incompleto
+    manifiesto = {'version': firma.hexdigest()[:16], 'origen': repr(version), 'instituciones': instituciones}
+    with open(os.path.join(ruta, MANIFIESTO + '.tmp'), 'w', encoding='utf-8') as archivo:
+        json.dump(manifiesto, archivo, ensure_ascii=False, indent=1)
+    os.replace(os.path.join(ruta, MANIFIESTO + '.tmp'), os.path.join(ruta, MANIFIESTO))
+    return manifiesto
+
+class DatosSnapshot(CapaDatos):
+    """
+    Capa de datos del tablero servida desde un snapshot exportado con
+    exportar_snapshot, sin abrir la base SQLite.
+
+    Los Parquet se leen una vez al iniciar, con memory map, y se separan por
+    institución.
+    """
+    def __init__(self, ruta='snapshot'):
+        if pyarrow is None:
+            raise ImportError("Servir desde un snapshot requiere pyarrow")
+        self.ruta = ruta
+        with open(os.path.join(ruta, MANIFIESTO), encoding='utf-8') as archivo:
+            self.manifiesto = json.load(archivo)
+        self.globales = {}
+        self.por_institucion = {}
+        self.vacios = {}
+        for agregado in AGREGADOS:
+            df = pq.read_table(os.path.join(ruta, f"{agregado}.parquet"), memory_map=True).to_pandas()
+            self.vacios[agregado] = df.iloc[:0]
+            if agregado in AGREGADOS_GLOBALES:
+                self.globales[agregado] = df
+            else:
+                self.por_institucion[agregado] = {
+                    institucion: grupo.reset_index(drop=True)
+                    for institucion, grupo in df.groupby('institucion', sort=False)
+                }
+
+    def version(self):
+        """Versión de los datos del snapshot."""
+        return f"snapshot:{self.manifiesto['version']}"
+
+    def instituciones(self):
+        return list(self.manifiesto['instituciones'])
+
+    def obtener(self, clave):
+        institucion = clave['institucion']
+        agregados = dict(self.globales)
+        for agregado, grupos in self.por_institucion.items():
+            agregados[agregado] = grupos.get(institucion, self.vacios[agregado])
+        return agregados
+
+if __name__ == '__main__':
+    # Uso: python snapshot.py [base de datos] [carpeta del snapshot]
+    manifiesto = exportar_snapshot(*sys.argv[1:3])
+    print(f"Snapshot {manifiesto['version']} con {len(manifiesto['instituciones'])} instituciones")
@@ -1,82 +1,190 @@
+import os
+import queue
+import threading
 import dash
 from dash import dash_table
-from dash import dcc, html
+from dash import dcc, html, ctx, Patch
 from dash.dependencies import Input, Output
 import plotly.express as px
 import plotly.graph_objs as go
-import pandas as pd
-import sqlite3
+from functools import wraps
+from cache import LRUCache
+from datos import COLUMNAS_TABLA, DatosTablero
+import metricas
+import respuestas
+from backend import crear_backend
+from cubo import DatosCubo
+from geografia import GEOJSON_PATH, cargar_geojson, departamentos
+from snapshot import DatosSnapshot
+
+# Base de datos del tablero; SNIES_DB permite apuntar a otra, por ejemplo en el benchmark
+DB_NAME = os.environ.get('SNIES_DB', 'snies.db')
+# Carpeta de un snapshot exportado con snapshot.py; si se indica, el tablero no abre la base
+SNAPSHOT_DIR = os.environ.get('SNIES_SNAPSHOT')
+# Con SNIES_CUBO=1 los agregados se calculan en memoria con el cubo OLAP de cubo.py
+USAR_CUBO = os.environ.get('SNIES_CUBO', '0') == '1'
+# Precálculo al iniciar: '1' (por defecto) los agregados de todas las instituciones,
+# 'figuras' también sus figuras en todos los estados, '0' nada
+PRECALENTAR = os.environ.get('SNIES_PRECALENTAR', '1')
+# Hilos que hacen el precálculo en segundo plano
+PRECALENTAR_HILOS = int(os.environ.get('SNIES_PRECALENTAR_HILOS', '4'))
 
 app = dash.Dash(__name__, external_stylesheets=['https://codepen.io/chriddyp/pen/bWLwgP.css'])
+# Servidor Flask para desplegar con gunicorn: gunicorn tablero:server
+server = app.server
+# Métricas de los callbacks y de las consultas en formato Prometheus; se desactivan con SNIES_METRICAS=0
+metricas.registrar_endpoint(server)
+# Respuestas comprimidas con brotli o gzip; se desactiva con SNIES_COMPRESION=0
+respuestas.comprimir(server)
+
+if SNAPSHOT_DIR:
+    # Agregados precalculados, leídos una vez del snapshot y servidos desde memoria
+    datos_tablero = DatosSnapshot(SNAPSHOT_DIR)
+else:
+    # Motor de consultas elegido con SNIES_BACKEND: SQLite con un pool de conexiones
+    # de solo lectura, o DuckDB sobre la exportación en Parquet del modelo estrella
+    backend = crear_backend(DB_NAME)
+
+    if USAR_CUBO:
+        # Hechos cargados una vez en arreglos de NumPy; cada agregado se calcula en memoria
+        datos_tablero = DatosCubo(backend)
+    else:
+        # Agregados de cada institución, consultados una vez y compartidos por todas las gráficas
+        datos_tablero = DatosTablero(backend)
+
+# Respuestas de los callbacks guardadas en el servidor por petición y versión de los datos
+respuestas.cache_callbacks(server, datos_tablero.version)
+
+# Instituciones de la base, leídas una vez al iniciar para las opciones del filtro
+INSTITUCIONES = datos_tablero.instituciones()
+INSTITUCION_INICIAL = 'FUNDACION UNIVERSITARIA KONRAD LORENZ'
+if INSTITUCION_INICIAL not in INSTITUCIONES:
+    INSTITUCION_INICIAL = INSTITUCIONES[0] if INSTITUCIONES else None
+
+# Estados del filtro: métrica -> etiqueta
+ESTADOS = {
+    'inscritos': 'Inscritos',
+    'admitidos': 'Admitidos',
+    'matriculados': 'Matriculados',
+    'graduados': 'Graduados',
+}
+
+# Tolerancia en grados para simplificar la geometría de los departamentos; 0 la deja completa
+GEOJSON_TOLERANCIA = 0.005
+
+# Filas por página de la tabla de datos
+TABLA_TAMANO_PAGINA = 25
+
+# Figuras ya construidas por (gráfica, institución, versión de los datos, estado)
+figuras = LRUCache(maxsize=128)
+
+# plotly express lee y modifica la plantilla compartida sin sincronizar, así que las
+# figuras se construyen de a una, tanto en los callbacks como en el precálculo
+construccion_figuras = threading.Lock()
+
+# Funciones que construyen las figuras de los callbacks con figura_por_estado
+constructores = []
+
+# Partes de la figura que dependen del estado seleccionado
+ATRIBUTOS_TRAZA = ('y', 'values', 'z', 'hovertemplate')
+ATRIBUTOS_LAYOUT = ('yaxis', 'coloraxis')
+
+def parche_estado(fig):
+    """
+    Retorna un Patch que lleva una figura ya dibujada de la misma institución al
+    estado de `fig`, cambiando solo los valores de las trazas y los títulos.
+    """
+    figura = fig.to_plotly_json()
+    parche = Patch()
+    for i, traza in enumerate(figura['data']):
+        for atributo in ATRIBUTOS_TRAZA:
+            if atributo in traza:
+                parche['data'][i][atributo] = traza[atributo]
+    for atributo in ATRIBUTOS_LAYOUT:
+        if atributo in figura['layout']:
+            parche['layout'][atributo] = figura['layout'][atributo]
+    return parche
+
+def figura_por_estado(construir):
+    """
+    Memoriza las figuras de un callback con entradas (datos, estado). Si solo
+    cambió el estado, la gráfica del navegador ya tiene la forma correcta y se
+    actualiza con un Patch en lugar de enviar la figura completa.
+    """
+    constructores.append(construir)
+
+    @wraps(construir)
+    def callback(datos, estado):
+        fig = figura(construir, datos, estado)
+        if ctx.triggered_id == 'estado-dropdown':
+            return parche_estado(fig)
+        return fig
+    return callback
+
+def figura(construir, datos, estado):
+    """Retorna la figura de `construir` para la llave de datos y el estado, construyéndola solo si no está en caché."""
+    clave = (construir.__name__, datos['institucion'], datos['version'], estado)
+    fig = figuras.get(clave)
+    if fig is None:
+        with construccion_figuras:
+            fig = construir(datos, estado)
+        figuras.put(clave, fig)
+    return fig
+
+def precalentar(instituciones, hilos=PRECALENTAR_HILOS, con_figuras=False):
+    """
+    Precalcula en segundo plano los agregados y la primera página de la tabla
+    de cada institución y, con `con_figuras`, sus figuras en todos los estados,
+    para que la primera selección de una institución no espere las consultas.
+    Los hilos son daemon y no retrasan el cierre del proceso; retorna los hilos.
+    """
+    # Los cachés deben alcanzar para todas las instituciones o el precálculo se descartaría a sí mismo
+    if isinstance(datos_tablero, DatosTablero):
+        resultados = datos_tablero.query_cache.results
+        resultados.maxsize = max(resultados.maxsize, 5 * len(instituciones) + 16)
+    if con_figuras:
+        figuras.maxsize = max(figuras.maxsize, len(constructores) * len(ESTADOS) * len(instituciones))
+
+    pendientes = queue.Queue()
+    for institucion in instituciones:
+        pendientes.put(institucion)
+
+    def trabajar():
+        while True:
+            try:
+                institucion = pendientes.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                clave = datos_tablero.clave(institucion)
+                datos_tablero.obtener(clave)
+                datos_tablero.pagina_programas(clave, 0, TABLA_TAMANO_PAGINA, [], '')
+                if con_figuras:
+                    for estado in ESTADOS:
+                        for construir in constructores:
+                            figura(construir, clave, estado)
+            except Exception:
+                # Una institución que falla se calculará cuando se pida; no debe detener las demás
+                server.logger.exception("No se pudo precalcular la institución %s", institucion)
 
-def get_db_connection():
-    conn = sqlite3.connect('snies.db')
-    return conn
-
-cantidadesPrograma = """
-    SELECT 
-        i.nombreInstitucion as institucion,
-        a.programaAcademico AS nombre_programa,
-        e.genero AS sexo,
-        SUM(h.inscritos) AS inscritos,
-        SUM(h.matriculados) AS matriculados,
-        SUM(h.admitidos) AS admitidos,
-        SUM(h.graduados) AS graduados
-    FROM TablaHechosSNIES h
-    JOIN DimensionInstitucion i ON h.idInstitucion = i.idInstitucion
-    JOIN DimensionAcademica a ON h.idAcademico = a.idAcademico
-    JOIN DimensionEstudiantes e ON h.idEstudiante = e.idEstudiante
-    WHERE a.nivelEducativo = 'Pregrado'
-    GROUP BY i.nombreInstitucion, a.programaAcademico, e.genero;
-"""
-
-query2 = """
-SELECT 
-    i.nombreInstitucion as institucion,
-    a.nivelEducativo AS nivel_academico,
-    a.modalidad,
-    SUM(h.inscritos) AS inscritos,
-    SUM(h.matriculados) AS matriculados,
-    SUM(h.admitidos) AS admitidos,
-    SUM(h.graduados) AS graduados
-FROM TablaHechosSNIES h
-JOIN DimensionInstitucion i ON h.idInstitucion = i.idInstitucion
-JOIN DimensionAcademica a ON h.idAcademico = a.idAcademico
-GROUP BY i.nombreInstitucion, a.nivelEducativo, a.modalidad;
-"""
-
-query4 = """
-SELECT 
-    i.nombreInstitucion as institucion,
-    a.nivelEducativo AS nivel_academico,
-    e.genero AS sexo,
-    SUM(h.inscritos) AS inscritos,
-    SUM(h.matriculados) AS matriculados,
-    SUM(h.admitidos) AS admitidos,
-    SUM(h.graduados) AS graduados
-FROM TablaHechosSNIES h
-JOIN DimensionInstitucion i ON h.idInstitucion = i.idInstitucion
-JOIN DimensionAcademica a ON h.idAcademico = a.idAcademico
-JOIN DimensionEstudiantes e ON h.idEstudiante = e.idEstudiante
-GROUP BY i.nombreInstitucion, a.nivelEducativo, e.genero;
-"""
-
-query_map = """
-SELECT 
-    i.nombreInstitucion as institucion,
-    d.codigoDepartamento AS codigo_departamento,
-    d.nombreDepartamento AS nombre_departamento,
-    SUM(h.inscritos) AS inscritos,
-    SUM(h.matriculados) AS matriculados,
-    SUM(h.admitidos) AS admitidos,
-    SUM(h.graduados) AS graduados
-FROM TablaHechosSNIES h
-JOIN DimensionInstitucion i ON h.idInstitucion = i.idInstitucion
-JOIN DimensionDepartamento d ON i.idInstitucionDpto = d.idDepartamento
-GROUP BY i.nombreInstitucion, d.codigoDepartamento, d.nombreDepartamento;
-"""
+    trabajadores = [threading.Thread(target=trabajar, name=f'precalentar-{i}', daemon=True) for i in range(max(1, hilos))]
+    for trabajador in trabajadores:
+        trabajador.start()
+    return trabajadores
+
+# Geometría local, simplificada y cargada una vez; el mapa no la pide a ningún servidor externo
+# (la copia versionada se regenera con: python geografia.py)
+try:
+    geojson_colombia = cargar_geojson(GEOJSON_PATH, GEOJSON_TOLERANCIA)
+except FileNotFoundError:
+    server.logger.error("No se encontró %s; el mapa se mostrará vacío. "
+                        "Para generarla: python geografia.py", GEOJSON_PATH)
+    geojson_colombia = None
 
 app.layout = html.Div([
+    # Llave de los agregados de la institución seleccionada; los datos quedan en el servidor
+    dcc.Store(id='datos-store'),
+
     html.H1("Proyecto Final - Visualización de Datos Educativos", 
             style={'textAlign': 'center', 'padding': '20px', 'color': '#343a40'}),
     
@@ -86,14 +194,8 @@ app.layout = html.Div([
             html.H3("Seleccionar Institución", style={'textAlign': 'center', 'color': '#343a40'}),
             dcc.Dropdown(
                 id='institucion-dropdown',
-                options=[
-                    {'label': 'FUNDACION UNIVERSITARIA KONRAD LORENZ', 'value': 'FUNDACION UNIVERSITARIA KONRAD LORENZ'},
-                    {'label': "UNIVERSIDAD NACIONAL DE COLOMBIA", 'value': "UNIVERSIDAD NACIONAL DE COLOMBIA"},
-                    {'label': "UNIVERSIDAD DE LOS ANDES", 'value': "UNIVERSIDAD DE LOS ANDES"},
-                    {'label': "UNIVERSIDAD ANTONIO NARIÑO", 'value': 'UNIVERSIDAD ANTONIO NARIÑO'},
-                    {'label': "UNIVERSIDAD EXTERNADO DE COLOMBIA", "value": "UNIVERSIDAD EXTERNADO DE COLOMBIA"}
-                ],
-                value="FUNDACION UNIVERSITARIA KONRAD LORENZ",
+                options=[{'label': institucion, 'value': institucion} for institucion in INSTITUCIONES],
+                value=INSTITUCION_INICIAL,
                 style={'margin': 'auto'}
             )
         ], style={"width": "50%", 'padding': '15px', 'margin': '10px', 'backgroundColor': '#ffffff', 'borderRadius': '10px'}),
@@ -103,12 +205,7 @@ app.layout = html.Div([
             html.H3("Seleccionar Estado", style={'textAlign': 'center', 'color': '#343a40'}),
             dcc.Dropdown(
                 id='estado-dropdown',
-                options=[
-                    {'label': 'Inscritos', 'value': 'inscritos'},
-                    {'label': 'Admitidos', 'value': 'admitidos'},
-                    {'label': 'Matriculados', 'value': 'matriculados'},
-                    {'label': 'Graduados', 'value': 'graduados'}
-                ],
+                options=[{'label': etiqueta, 'value': estado} for estado, etiqueta in ESTADOS.items()],
                 value='matriculados',
                 style={'margin': 'auto'}
             )
@@ -156,21 +253,49 @@ app.layout = html.Div([
     # Tabla
     html.Div([
         html.H1("Datos recopilados", style={'textAlign': 'center'}),
-        html.Div(id='table-container')
+        html.Div(id='table-container', children=[
+            # Paginación, orden y filtro resueltos en el servidor: solo se envía la página visible
+            dash_table.DataTable(
+                id='data-table',
+                columns=[
+                    {"name": col, "id": col} for col in COLUMNAS_TABLA
+                ],
+                page_current=0,
+                page_size=TABLA_TAMANO_PAGINA,
+                page_action='custom',
+                sort_action='custom',
+                sort_mode='multi',
+                sort_by=[],
+                filter_action='custom',
+                filter_query='',
+                style_table={'height': '400px', 'overflowY': 'auto'},
+                style_cell={'textAlign': 'center', 'padding': '10px'},
+                style_header={'backgroundColor': 'lightgray', 'fontWeight': 'bold'},
+            )
+        ])
     ])
 ], style={'backgroundColor': '#f2f2f2', 'padding': '20px'})
 
+# Callback: Consulta única de los agregados de la institución seleccionada
+@app.callback(
+    Output('datos-store', 'data'),
+    Input('institucion-dropdown', 'value')
+)
+@metricas.callback
+def update_datos(institucion):
+    clave = datos_tablero.clave(institucion)
+    datos_tablero.obtener(clave)
+    return clave
+
 @app.callback(
     Output('program_geneder', 'figure'),
-    [Input('institucion-dropdown', 'value'),
+    [Input('datos-store', 'data'),
      Input('estado-dropdown', 'value')]
 )
-def update_program_gender(institucion, estado):
-    conn = get_db_connection()
-    df = pd.read_sql_query(cantidadesPrograma, conn)
-    conn.close()
-    
-    df = df[df['institucion'] == institucion]
+@metricas.callback
+@figura_por_estado
+def update_program_gender(datos, estado):
+    df = datos_tablero.obtener(datos)['programas']
 
     fig = px.bar(
         df,
@@ -184,15 +309,13 @@ def update_program_gender(institucion, estado):
 
 @app.callback(
     Output('program-distribution', 'figure'),
-    [Input('institucion-dropdown', 'value'),
+    [Input('datos-store', 'data'),
      Input('estado-dropdown', 'value')]
 )
-def update_program_distribution(institucion, estado):
-    conn = get_db_connection()
-    df = pd.read_sql_query(cantidadesPrograma, conn)
-    conn.close()
-    
-    df = df[df['institucion'] == institucion]
+@metricas.callback
+@figura_por_estado
+def update_program_distribution(datos, estado):
+    df = datos_tablero.obtener(datos)['programas']
 
     # Crear gráfico de pie
     fig = px.pie(
@@ -209,13 +332,13 @@ def update_program_distribution(institucion, estado):
 # Callback: Inscritos y Matriculados por Modalidad y Nivel
 @app.callback(
     Output('level-modality-dist', 'figure'),
-    [Input('institucion-dropdown', 'value'),
+    [Input('datos-store', 'data'),
     Input('estado-dropdown', 'value')]
 )
-def update_level_modality_distribution(institucion, estado):
-    conn = get_db_connection()
-    df = pd.read_sql_query(query2, conn)
-    conn.close()
+@metricas.callback
+@figura_por_estado
+def update_level_modality_distribution(datos, estado):
+    df = datos_tablero.obtener(datos)['nivel_modalidad']
     
     # df = df[df['institucion'] == institucion]
     df = df[df['modalidad'] != "Sin información"]
@@ -235,17 +358,14 @@ def update_level_modality_distribution(institucion, estado):
 # Callback: Distribución por Género y Nivel Académico
 @app.callback(
     Output('gender-academic-level', 'figure'),
-    [Input('institucion-dropdown', 'value'),
+    [Input('datos-store', 'data'),
     Input('estado-dropdown', 'value')]
 )
-def update_gender_academic_level(institucion, estado):
-    conn = get_db_connection()
-    try:
-        df = pd.read_sql_query(query4, conn)
-    finally:
-        conn.close()
-        
-    df = df[df['institucion'] == institucion]
+@metricas.callback
+@figura_por_estado
+def update_gender_academic_level(datos, estado):
+    df = datos_tablero.obtener(datos)['nivel_genero']
+
     df = df[df['nivel_academico'] != "Sin información"]
     # print(df)
     # print(estado)
@@ -263,19 +383,24 @@ def update_gender_academic_level(institucion, estado):
 # Callback: Mapa de Graduados por Departamento
 @app.callback(
     Output('graduates-map', 'figure'),
-    [Input('institucion-dropdown', 'value'),
+    [Input('datos-store', 'data'),
     Input('estado-dropdown', 'value')]
 )
-def update_graduates_map(institucion, estado):
-    conn = get_db_connection()
-    df = pd.read_sql_query(query_map, conn)
-    conn.close()
-    
-    df = df[df['institucion'] == institucion]
+@metricas.callback
+@figura_por_estado
+def update_graduates_map(datos, estado):
+    df = datos_tablero.obtener(datos)['departamentos']
     
+    if geojson_colombia is None:
+        fig = go.Figure()
+        fig.update_layout(xaxis_visible=False, yaxis_visible=False, annotations=[dict(
+            text='Geometría de departamentos no disponible', showarrow=False, xref='paper', yref='paper')])
+        return fig
+    geojson = departamentos(geojson_colombia, df['codigo_departamento'])
+
     fig = px.choropleth(
         df,
-        geojson="https://gist.githubusercontent.com/john-guerra/43c7656821069d00dcbc/raw/be6a6e239cd5b5b803c6e7c2ec405b793a9064dd/Colombia.geo.json",
+        geojson=geojson,
         locations="codigo_departamento",
         featureidkey="properties.DPTO",
         color=estado,
@@ -298,28 +423,32 @@ def update_graduates_map(institucion, estado):
     return fig
 
 @app.callback(
-    Output('table-container', 'children'),
-    Input('institucion-dropdown', 'value')
+    [Output('data-table', 'data'),
+     Output('data-table', 'page_count'),
+     Output('data-table', 'page_current')],
+    [Input('datos-store', 'data'),
+     Input('data-table', 'page_current'),
+     Input('data-table', 'page_size'),
+     Input('data-table', 'sort_by'),
+     Input('data-table', 'filter_query')]
 )
-def update_table(institucion):
-    conn = get_db_connection()
-    df = pd.read_sql_query(cantidadesPrograma, conn)
-    conn.close()
-
-    df = df[df['institucion'] == institucion]
-
-    table = dash_table.DataTable(
-        id='data-table',
-        columns=[
-            {"name": col, "id": col} for col in df.columns
-        ],
-        data=df.to_dict('records'),
-        style_table={'height': '400px', 'overflowY': 'auto'},
-        style_cell={'textAlign': 'center', 'padding': '10px'},
-        style_header={'backgroundColor': 'lightgray', 'fontWeight': 'bold'},
-    )
-    
-    return table
+@metricas.callback
+def update_table(datos, page_current, page_size, sort_by, filter_query):
+    # Con otra institución u otro filtro la página actual puede no existir; se vuelve a la primera
+    if ctx.triggered_id == 'datos-store' or 'data-table.filter_query' in ctx.triggered_prop_ids:
+        page_current = 0
+        pagina = 0
+    else:
+        pagina = dash.no_update
+    df, total = datos_tablero.pagina_programas(datos, page_current or 0, page_size, sort_by, filter_query)
+    page_count = max(1, -(-total // page_size))
+    return df.to_dict('records'), page_count, pagina
+
+# El precálculo empieza al importar el módulo, en paralelo con el arranque del servidor;
+# la institución inicial va primero porque es la que pide cada página nueva
+if PRECALENTAR != '0':
+    precalentar(sorted(INSTITUCIONES, key=lambda institucion: institucion != INSTITUCION_INICIAL),
+                con_figuras=PRECALENTAR == 'figuras')
 
 if __name__ == '__main__':
     app.run_server(debug=True)
@@ -0,0 +1,100 @@
+import os
+import sqlite3
+import threading
+import pytest
+from backend import SQLiteBackend
+from benchmark import ENCABEZADO, HOJA, escribir_excel, generar_datos
+from model import Cargue, Database
+
+@pytest.fixture
+def datos():
+    return generar_datos(n_instituciones=4, n_programas=30, semilla=2)
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'snies.db'), batch_size=200)
+    db.create_tables()
+    return db
+
+def errores_de_lectura(db_name, cargar):
+    """Ejecuta `cargar` mientras otro hilo lee las tablas de resumen; retorna los errores de ese hilo."""
+    errores = []
+    terminado = threading.Event()
+
+    def leer():
+        conexion = sqlite3.connect(db_name, timeout=30)
+        try:
+            while not terminado.is_set():
+                try:
+                    conexion.execute("SELECT COUNT(*) FROM ResumenProgramaGenero").fetchone()
+                    conexion.execute("SELECT COUNT(*) FROM ResumenDepartamento").fetchone()
+                except sqlite3.Error as error:
+                    errores.append(str(error))
+        finally:
+            conexion.close()
+
+    lector = threading.Thread(target=leer)
+    lector.start()
+    try:
+        cargar()
+    finally:
+        terminado.set()
+        lector.join()
+    return errores
+
+def test_tablero_no_ve_el_cargue_masivo_a_medias(db, datos):
+    carga = Cargue(cache_dir=None)
+    df = carga.unificar_dataframes(datos['I'], datos['M'], datos['A'], datos['G'])
+
+    def cargar():
+        for _ in range(3):
+            db.process_dataframe_to_db_bulk(df)
+
+    assert errores_de_lectura(db.db_name, cargar) == []
+    conexion = sqlite3.connect(db.db_name)
+    try:
+        total = conexion.execute("SELECT SUM(matriculados) FROM ResumenNivelGenero").fetchone()[0]
+        restantes = conexion.execute("SELECT name FROM sqlite_master WHERE name LIKE '%_nuevo'").fetchall()
+    finally:
+        conexion.close()
+    assert total == 3 * int(df['MATRICULADOS'].sum())
+    assert restantes == []
+
+def test_tablero_no_ve_el_cargue_por_bloques_a_medias(db, datos, tmp_path):
+    especificaciones = []
+    for dataset, df in datos.items():
+        ruta = str(tmp_path / f"{dataset}.xlsx")
+        escribir_excel(df, ruta)
+        especificaciones.append(dict(nombre_archivo=ruta, hoja=HOJA, encabezado=ENCABEZADO, dataset=dataset))
+    carga = Cargue(cache_dir=None)
+
+    def cargar():
+        for _ in range(2):
+            db.process_files_streaming(carga, especificaciones, tamano_bloque=100)
+
+    assert errores_de_lectura(db.db_name, cargar) == []
+    assert os.path.exists(db.db_name)
+
+def test_version_solo_cambia_al_publicar_el_cargue(db, datos):
+    backend = SQLiteBackend(db.db_name)
+    inicial = backend.version()
+    carga = Cargue(cache_dir=None)
+    df = carga.unificar_dataframes(datos['I'], datos['M'], datos['A'], datos['G'])
+    versiones = set()
+    terminado = threading.Event()
+
+    def observar():
+        while not terminado.is_set():
+            versiones.add(backend.version())
+
+    observador = threading.Thread(target=observar)
+    observador.start()
+    try:
+        db.process_dataframe_to_db(df)
+    finally:
+        terminado.set()
+        observador.join()
+    final = backend.version()
+    backend.close()
+    assert final != inicial
+    assert versiones <= {inicial, final}
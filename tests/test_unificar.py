@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+import pytest
+from benchmark import generar_datos
+from model import Cargue
+
+COLUMNAS_MERGE = [
+    'CÓDIGO DE LA INSTITUCIÓN',
+    'INSTITUCIÓN DE EDUCACIÓN SUPERIOR (IES)',
+    'CARÁCTER IES',
+    'PROGRAMA ACADÉMICO',
+    'NIVEL ACADÉMICO',
+    'MODALIDAD',
+    'CÓDIGO DEL DEPARTAMENTO (PROGRAMA)',
+    'DEPARTAMENTO DE OFERTA DEL PROGRAMA',
+    'CÓDIGO DEL MUNICIPIO (PROGRAMA)',
+    'MUNICIPIO DE OFERTA DEL PROGRAMA',
+    'SEXO',
+    'AÑO',
+    'SEMESTRE'
+]
+METRICAS = ['INSCRITOS', 'MATRICULADOS', 'ADMITIDOS', 'GRADUADOS']
+
+def unificar_con_merge(df_inscritos, df_matriculados, df_admitidos, df_graduados):
+    """Versión anterior de Cargue.unificar_dataframes, con merge externos encadenados."""
+    df_final = df_inscritos[COLUMNAS_MERGE + ['INSCRITOS']].copy()
+    if df_matriculados is not None:
+        df_final = df_final.merge(df_matriculados[COLUMNAS_MERGE + ['MATRICULADOS']], on=COLUMNAS_MERGE, how='outer')
+    if df_admitidos is not None:
+        df_final = df_final.merge(df_admitidos[COLUMNAS_MERGE + ['ADMITIDOS']], on=COLUMNAS_MERGE, how='outer')
+    if df_graduados is not None:
+        df_final = df_final.merge(df_graduados[COLUMNAS_MERGE + ['GRADUADOS']], on=COLUMNAS_MERGE, how='outer')
+    for metrica in METRICAS:
+        if metrica not in df_final.columns:
+            df_final[metrica] = 0
+    df_final[METRICAS] = df_final[METRICAS].fillna(0)
+    return df_final
+
+# Llaves numéricas, que un archivo puede traer como float y otro como entero
+COLUMNAS_NUMERICAS = ['CÓDIGO DE LA INSTITUCIÓN', 'CÓDIGO DEL MUNICIPIO (PROGRAMA)', 'AÑO', 'SEMESTRE']
+
+def normalizar(df):
+    """Lleva un resultado a tipos comparables y a un orden fijo de filas."""
+    df = df[COLUMNAS_MERGE + METRICAS].copy()
+    for columna in COLUMNAS_MERGE:
+        if columna in COLUMNAS_NUMERICAS:
+            df[columna] = pd.to_numeric(df[columna].astype(object)).astype('Int64')
+        df[columna] = df[columna].astype(object).where(df[columna].notna(), None).astype(str)
+    df[METRICAS] = df[METRICAS].astype(np.int64)
+    return df.sort_values(COLUMNAS_MERGE).reset_index(drop=True)
+
+def fila(institucion, programa, sexo, semestre, municipio='Bogotá, D.C.'):
+    return {
+        'CÓDIGO DE LA INSTITUCIÓN': 1000 + institucion,
+        'INSTITUCIÓN DE EDUCACIÓN SUPERIOR (IES)': f"INSTITUCION {institucion}",
+        'CARÁCTER IES': 'Universidad',
+        'PROGRAMA ACADÉMICO': f"PROGRAMA {programa}",
+        'NIVEL ACADÉMICO': 'Pregrado',
+        'MODALIDAD': 'Presencial',
+        'CÓDIGO DEL DEPARTAMENTO (PROGRAMA)': '11',
+        'DEPARTAMENTO DE OFERTA DEL PROGRAMA': 'Bogotá, D.C.',
+        'CÓDIGO DEL MUNICIPIO (PROGRAMA)': 11001,
+        'MUNICIPIO DE OFERTA DEL PROGRAMA': municipio,
+        'SEXO': sexo,
+        'AÑO': 2023,
+        'SEMESTRE': semestre,
+    }
+
+def dataset(filas, metrica, valores):
+    df = pd.DataFrame(filas)
+    df[metrica] = valores
+    return df
+
+@pytest.fixture
+def datasets_pequenos():
+    # Cada dataset cubre llaves distintas; una llave tiene el municipio vacío
+    llaves = [
+        fila(1, 1, 'Femenino', 1),
+        fila(1, 1, 'Masculino', 1),
+        fila(1, 2, 'Femenino', 2),
+        fila(2, 1, 'Masculino', 2, municipio=np.nan),
+        fila(2, 3, 'Femenino', 1),
+    ]
+    return (
+        dataset(llaves[:4], 'INSCRITOS', [10, 20, 30, 40]),
+        dataset(llaves[1:], 'MATRICULADOS', [5, 6, 7, 8]),
+        dataset([llaves[0], llaves[3]], 'ADMITIDOS', [3, 4]),
+        dataset([llaves[4]], 'GRADUADOS', [1]),
+    )
+
+def test_igual_al_merge_con_llaves_nulas_y_faltantes(datasets_pequenos):
+    resultado = Cargue(cache_dir=None).unificar_dataframes(*datasets_pequenos)
+    esperado = unificar_con_merge(*datasets_pequenos)
+    assert len(resultado) == 5
+    pd.testing.assert_frame_equal(normalizar(resultado), normalizar(esperado))
+
+def test_igual_al_merge_sin_un_dataset(datasets_pequenos):
+    df_inscritos, df_matriculados, df_admitidos, _ = datasets_pequenos
+    resultado = Cargue(cache_dir=None).unificar_dataframes(df_inscritos, df_matriculados, df_admitidos, None)
+    esperado = unificar_con_merge(df_inscritos, df_matriculados, df_admitidos, None)
+    pd.testing.assert_frame_equal(normalizar(resultado), normalizar(esperado))
+
+def test_igual_al_merge_con_datos_generados():
+    datos = generar_datos(n_instituciones=3, n_programas=40, anios=(2022, 2023), semilla=1)
+    argumentos = (datos['I'], datos['M'], datos['A'], datos['G'])
+    resultado = Cargue(cache_dir=None).unificar_dataframes(*argumentos)
+    esperado = unificar_con_merge(*argumentos)
+    pd.testing.assert_frame_equal(normalizar(resultado), normalizar(esperado))
+
+def test_anio_entero_y_float_en_distintos_archivos(datasets_pequenos):
+    # Una celda vacía en un archivo hace que su AÑO se lea como float
+    df_inscritos, df_matriculados, df_admitidos, df_graduados = (df.copy() for df in datasets_pequenos)
+    df_matriculados = pd.concat([df_matriculados, dataset([fila(3, 1, 'Femenino', 1)], 'MATRICULADOS', [9])],
+                                ignore_index=True)
+    df_matriculados['AÑO'] = df_matriculados['AÑO'].astype(float)
+    df_matriculados.loc[len(df_matriculados) - 1, 'AÑO'] = np.nan
+    argumentos = (df_inscritos, df_matriculados, df_admitidos, df_graduados)
+
+    carga = Cargue(cache_dir=None)
+    compactos = [carga.tipos_compactos(df.copy()) for df in argumentos]
+    assert compactos[1]['AÑO'].cat.categories.dtype != compactos[0]['AÑO'].cat.categories.dtype
+    resultado = carga.unificar_dataframes(*compactos)
+    esperado = unificar_con_merge(*argumentos)
+    assert resultado['AÑO'].cat.categories.dtype == np.int64
+    pd.testing.assert_frame_equal(normalizar(resultado), normalizar(esperado))